@@ -0,0 +1,24 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+
+def run_parallel(func, tasks, max_workers=None):
+    """Wendet func auf alle Aufträge an und liefert die Ergebnisse in Auftragsreihenfolge.
+
+    Standard ist ein Prozess-Pool (max_workers=None: CPU-Anzahl); max_workers=1 rechnet
+    seriell im aktuellen Prozess (z.B. zum Debuggen). func und Aufträge müssen picklebar sein.
+    """
+    tasks = list(tasks)
+    if max_workers == 1:
+        return [func(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(func, tasks, chunksize=max(1, len(tasks) // 64)))
+
+
+@contextmanager
+def record_error(row):
+    """Fehler einer einzelnen Datei in row["error"] vermerken, statt den ganzen Batch abzubrechen"""
+    try:
+        yield
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
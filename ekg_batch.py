@@ -0,0 +1,105 @@
+import argparse
+import os
+
+import pandas as pd
+
+from batch_utils import record_error, run_parallel
+from ekgdata import DEFAULT_PEAK_METHOD, PEAK_METHODS, EKGdata
+from person import Person
+from read_data import open_repository
+
+
+def build_tasks(person_data, peak_method=DEFAULT_PEAK_METHOD):
+    """Erstellt pro EKG-Test einer Person einen Auftrag (nur Metadaten, picklebar)"""
+    tasks = []
+    for person_dict in person_data:
+        person = Person(person_dict)
+        try:
+            max_puls = person.calc_max_heart_rate(gender=person.gender)
+        except ValueError:
+            max_puls = 220
+        for ekg_dict in person.ekg_tests_raw:
+            tasks.append({
+                "person_id": person.id,
+                "name": f"{person.lastname}, {person.firstname}",
+                "ekg_dict": ekg_dict,
+                "max_puls": max_puls,
+                "peak_method": peak_method,
+            })
+    return tasks
+
+
+def analyse_task(task, with_neurokit=False):
+    """Wertet einen EKG-Test aus und liefert eine Zeile für die Übersichtstabelle"""
+    ekg_dict = task["ekg_dict"]
+    row = {
+        "person_id": task["person_id"],
+        "name": task["name"],
+        "ekg_id": ekg_dict["id"],
+        "date": ekg_dict["date"],
+        "result_link": ekg_dict["result_link"],
+        "max_puls": task["max_puls"],
+        "peak_method": task["peak_method"],
+        "error": None,
+    }
+    with record_error(row):  # eine defekte Aufnahme soll nicht den ganzen Batch abbrechen
+        ekg = EKGdata(ekg_dict, max_puls=task["max_puls"], peak_method=task["peak_method"])
+        ekg.find_peaks()
+        irregularities = ekg.detect_irregularities()
+        row.update({
+            "n_peaks": len(ekg.peaks),
+            "estimated_hr": ekg.estimate_hr(),
+            "hr_variability_ms": ekg.hr_variability(),
+            "rr_interval_avg_ms": ekg.rr_interval_avg(),
+            "irregular_rr": bool(irregularities["irregular_rr"]),
+        })
+        hrv = ekg.hrv_metrics()
+        row.update({f"native_{key}": hrv[key] for key in ("HRV_SDNN", "HRV_RMSSD", "HRV_pNN50", "HRV_LFHF")})
+        if with_neurokit:
+            import neurokit2 as nk
+            _, info = nk.ecg_process(ekg.df["Messwerte in mV"].values, sampling_rate=ekg.sampling_rate)
+            hrv_time = nk.hrv_time(info["ECG_R_Peaks"], sampling_rate=ekg.sampling_rate, show=False)
+            hrv_freq = nk.hrv_frequency(info["ECG_R_Peaks"], sampling_rate=ekg.sampling_rate, show=False)
+            row.update({
+                "HRV_SDNN": hrv_time["HRV_SDNN"].iloc[0],
+                "HRV_RMSSD": hrv_time["HRV_RMSSD"].iloc[0],
+                "HRV_pNN50": hrv_time["HRV_pNN50"].iloc[0],
+                "HRV_LFHF": hrv_freq["HRV_LFHF"].iloc[0],
+            })
+    return row
+
+
+def _analyse_task_with_neurokit(task):
+    return analyse_task(task, with_neurokit=True)
+
+
+def batch_analyse(person_data, max_workers=None, with_neurokit=False, peak_method=DEFAULT_PEAK_METHOD):
+    """Analysiert alle EKG-Tests parallel in einem Prozess-Pool und liefert einen DataFrame"""
+    tasks = build_tasks(person_data, peak_method)
+    worker = _analyse_task_with_neurokit if with_neurokit else analyse_task
+    return pd.DataFrame(run_parallel(worker, tasks, max_workers))
+
+
+def save_summary(df, output_path):
+    """Speichert die Übersicht als Parquet (Endung .parquet) oder CSV"""
+    if os.path.splitext(output_path)[1].lower() == ".parquet":
+        df.to_parquet(output_path, index=False)
+    else:
+        df.to_csv(output_path, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-Auswertung aller EKG-Tests aus der Personen-Datenbank")
+    parser.add_argument("--db", default="data/person_db.json", help="Pfad zur Personen-Datenbank (JSON oder SQLite)")
+    parser.add_argument("--output", default="ekg_summary.csv", help="Ausgabedatei (.csv oder .parquet)")
+    parser.add_argument("--workers", type=int, default=None, help="Anzahl Prozesse (Standard: CPU-Anzahl)")
+    parser.add_argument("--peak-method", choices=PEAK_METHODS, default=DEFAULT_PEAK_METHOD,
+                        help="R-Zacken-Erkennung (Standard wie in der App)")
+    parser.add_argument("--neurokit", action="store_true", help="Zusätzlich HRV-Werte mit NeuroKit2 berechnen")
+    args = parser.parse_args()
+
+    person_data = open_repository(args.db).all()
+    summary = batch_analyse(person_data, max_workers=args.workers, with_neurokit=args.neurokit,
+                           peak_method=args.peak_method)
+    save_summary(summary, args.output)
+    print(f"{len(summary)} EKG-Tests ausgewertet, Ergebnis gespeichert in {args.output}")
@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from ekgdata import EKG_COLUMNS, peak_distance_samples, detect_r_peaks
+
+
+class RingBuffer:
+    """Begrenzter Puffer für Messwerte und Zeiten mit globalen Sample-Indizes.
+
+    Intern wird doppelte Kapazität reserviert: ist das Ende erreicht, werden nur die
+    letzten capacity Samples an den Anfang kopiert. So bleibt der Inhalt immer
+    zusammenhängend (direkt nutzbar für find_peaks) und das Anhängen amortisiert O(Batch).
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._values = np.empty(2 * capacity, dtype=float)
+        self._times = np.empty(2 * capacity, dtype=float)
+        self._head = 0  # Position des ältesten Samples im Speicher
+        self._size = 0
+        self.end = 0  # globaler Index nach dem neuesten Sample
+
+    @property
+    def start(self):
+        """Globaler Index des ältesten noch gehaltenen Samples"""
+        return self.end - self._size
+
+    def append(self, values, times):
+        values, times = np.asarray(values, dtype=float), np.asarray(times, dtype=float)
+        if len(values) > self.capacity:  # riesiger Batch: nur das Ende passt hinein
+            self.end += len(values) - self.capacity
+            values, times = values[-self.capacity:], times[-self.capacity:]
+
+        n = len(values)
+        if self._head + self._size + n > len(self._values):
+            keep = min(self._size, self.capacity - n)
+            source = self._head + self._size - keep
+            self._values[:keep] = self._values[source:source + keep]
+            self._times[:keep] = self._times[source:source + keep]
+            self._head, self._size = 0, keep
+        write = self._head + self._size
+        self._values[write:write + n] = values
+        self._times[write:write + n] = times
+        self._size += n
+        self.end += n
+
+        if self._size > self.capacity:
+            self._head += self._size - self.capacity
+            self._size = self.capacity
+
+    def view(self, global_from=None):
+        """Werte und Zeiten ab globalem Index global_from (Standard: alles im Puffer)"""
+        offset = 0 if global_from is None else max(global_from - self.start, 0)
+        begin, stop = self._head + offset, self._head + self._size
+        return self._values[begin:stop], self._times[begin:stop]
+
+
+class LivePeakDetector:
+    """Inkrementelle R-Zacken-Erkennung für laufende Aufnahmen.
+
+    Gleiche Logik wie EKGdata.find_peaks (detect_r_peaks, Mindestabstand aus max_puls), die
+    Schwelle ist aber das 90%-Perzentil über den Ringpuffer (gleitend, da die Gesamtaufnahme
+    noch nicht bekannt ist). Mit fest vorgegebenem height (z.B. dem globalen 90%-Perzentil)
+    liefert ein Replay exakt die Peaks von find_peaks. Wie bei stream_rr_intervals wird ein
+    Peak erst ausgegeben, wenn margin Samples dahinter gelesen wurden; pro Batch wird nur
+    der offene Bereich plus Kontext ausgewertet.
+    """
+
+    def __init__(self, max_puls=220, sampling_rate=None, height=None,
+                 buffer_seconds=10, rr_window=10, overlap_factor=8):
+        self.max_puls = max_puls
+        self.sampling_rate = sampling_rate
+        self.height = height
+        self.buffer_seconds = buffer_seconds
+        self.overlap_factor = overlap_factor
+        self.buffer = None
+        self._pending = []  # Batches, bis die Sampling-Rate geschätzt werden kann
+        self._emitted_until = 0
+        self._last_peak_time = None
+        self.recent_rr = deque(maxlen=rr_window)
+        self.n_peaks = 0
+
+    def _start(self, values, times):
+        if self.sampling_rate is None:
+            self.sampling_rate = 1000 / np.median(np.diff(times))
+        self.distance = peak_distance_samples(self.max_puls, self.sampling_rate)
+        self.margin = max(self.overlap_factor * self.distance, 1)
+        capacity = max(int(self.buffer_seconds * self.sampling_rate), 4 * self.margin)
+        self.buffer = RingBuffer(capacity)
+
+    def process_batch(self, values, times, final=False):
+        """Neue Samples verarbeiten; liefert die neu bestätigten Peaks mit RR-Intervallen.
+
+        final=True bestätigt auch die Peaks am Ende (Aufnahme abgeschlossen).
+        """
+        if self.buffer is None:
+            self._pending.append((np.asarray(values, dtype=float), np.asarray(times, dtype=float)))
+            if sum(len(v) for v, _ in self._pending) < 2 and not final:
+                return _empty_update()
+            values = np.concatenate([v for v, _ in self._pending])
+            times = np.concatenate([t for _, t in self._pending])
+            self._pending = []
+            if len(values) < 2:
+                return _empty_update()
+            self._start(values, times)
+
+        self.buffer.append(values, times)
+        confirmed_until = self.buffer.end if final else self.buffer.end - self.margin
+        if confirmed_until <= self._emitted_until:
+            return _empty_update()
+
+        # Kontext vor dem offenen Bereich, damit der Mindestabstand korrekt greift
+        window_start = max(self._emitted_until - self.margin, self.buffer.start)
+        window_values, window_times = self.buffer.view(window_start)
+        height = self.height
+        if height is None:
+            height = np.percentile(self.buffer.view()[0], 90)
+
+        local_peaks = detect_r_peaks(window_values, self.distance, height)
+        global_peaks = local_peaks + window_start
+        keep = (global_peaks >= self._emitted_until) & (global_peaks < confirmed_until)
+        peaks = global_peaks[keep]
+        peak_times = window_times[local_peaks[keep]]
+
+        with_previous = peak_times if self._last_peak_time is None \
+            else np.concatenate([[self._last_peak_time], peak_times])
+        rr_ms = np.diff(with_previous)
+        if len(peak_times) > 0:
+            self._last_peak_time = peak_times[-1]
+        self._emitted_until = confirmed_until
+        self.recent_rr.extend(rr_ms.tolist())
+        self.n_peaks += len(peaks)
+        return {"peaks": peaks, "peak_times_ms": peak_times, "rr_ms": rr_ms}
+
+    def rolling_values(self):
+        """Gleitende Herzfrequenz (bpm) und mittleres RR-Intervall (ms) der letzten Schläge"""
+        if not self.recent_rr:
+            return None, None
+        rr_avg = float(np.mean(self.recent_rr))
+        return 60000 / rr_avg, rr_avg
+
+
+def _empty_update():
+    return {"peaks": np.array([], dtype=int), "peak_times_ms": np.array([]), "rr_ms": np.array([])}
+
+
+async def replay_ekg_file(data_path, batch_size=50, speed=1.0):
+    """Simuliert eine Live-Quelle: liefert eine gespeicherte Aufnahme in Batches (Werte, Zeiten).
+
+    speed=1.0 entspricht Echtzeit, speed=0 liefert so schnell wie möglich.
+    """
+    df = pd.read_csv(data_path, sep='\t', header=None, names=EKG_COLUMNS)
+    values, times = df["Messwerte in mV"].values, df["Zeit in ms"].values
+    started = time.perf_counter()
+    for begin in range(0, len(values), batch_size):
+        batch_times = times[begin:begin + batch_size]
+        if speed > 0:
+            due = (batch_times[-1] - times[0]) / 1000 / speed
+            await asyncio.sleep(max(due - (time.perf_counter() - started), 0))
+        yield values[begin:begin + batch_size], batch_times
+
+
+async def read_stream_batches(reader, batch_size=50):
+    """Batches aus einem asyncio.StreamReader (Socket oder verfolgte Datei).
+
+    Erwartet dasselbe Zeilenformat wie die .txt-Dateien: 'Messwert<TAB>Zeit'.
+    """
+    values, times = [], []
+    async for line in reader:
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        values.append(float(parts[0]))
+        times.append(float(parts[1]))
+        if len(values) >= batch_size:
+            yield np.array(values), np.array(times)
+            values, times = [], []
+    if values:
+        yield np.array(values), np.array(times)
+
+
+async def monitor(source, detector=None, **detector_kwargs):
+    """Verarbeitet eine asynchrone Batch-Quelle und liefert nach jedem Batch ein Update.
+
+    Das Update enthält die neu bestätigten Peaks/RR-Intervalle, die gleitende HR und
+    mittlere RR sowie die Verarbeitungszeit des Batches in ms.
+    """
+    detector = detector or LivePeakDetector(**detector_kwargs)
+    async for values, times in source:
+        started = time.perf_counter()
+        update = detector.process_batch(values, times)
+        hr, rr_avg = detector.rolling_values()
+        update.update({
+            "time_ms": float(times[-1]) if len(times) else None,
+            "hr_bpm": hr,
+            "rr_avg_ms": rr_avg,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+        })
+        yield update
+
+    # Aufnahme beendet: restliche Peaks bestätigen
+    update = detector.process_batch([], [], final=True)
+    hr, rr_avg = detector.rolling_values()
+    update.update({"time_ms": None, "hr_bpm": hr, "rr_avg_ms": rr_avg, "latency_ms": 0.0})
+    yield update
+
+
+async def publish(source, queue, **detector_kwargs):
+    """Schreibt alle Updates in eine asyncio.Queue (z.B. für mehrere Anzeigen); None markiert das Ende"""
+    async for update in monitor(source, **detector_kwargs):
+        await queue.put(update)
+    await queue.put(None)
+
+
+async def _replay(args):
+    source = replay_ekg_file(args.file, batch_size=args.batch_size, speed=args.speed)
+    latencies, n_peaks, last_print = [], 0, None
+    async for update in monitor(source, max_puls=args.max_puls, buffer_seconds=args.buffer_seconds):
+        latencies.append(update["latency_ms"])
+        n_peaks += len(update["peaks"])
+        if update["hr_bpm"] is not None and update["time_ms"] is not None \
+                and (last_print is None or update["time_ms"] - last_print >= args.print_every * 1000):
+            print(f"t={update['time_ms'] / 1000:7.1f} s  HR={update['hr_bpm']:5.1f} bpm  "
+                  f"RR={update['rr_avg_ms']:6.1f} ms")
+            last_print = update["time_ms"]
+
+    latencies = np.array(latencies)
+    print(f"{n_peaks} Peaks, Latenz pro Batch: Median {np.median(latencies):.3f} ms, "
+          f"99%-Perzentil {np.percentile(latencies, 99):.3f} ms, Max {latencies.max():.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live-Auswertung eines EKGs (Replay einer gespeicherten Aufnahme)")
+    parser.add_argument("file", nargs="?", default="data/ekg_data/04_Belastung.txt", help="EKG-Datei zum Abspielen")
+    parser.add_argument("--batch-size", type=int, default=50, help="Samples pro Batch")
+    parser.add_argument("--speed", type=float, default=0, help="Abspielgeschwindigkeit (1 = Echtzeit, 0 = maximal)")
+    parser.add_argument("--max-puls", type=int, default=220, help="Maximalpuls für den Peak-Mindestabstand")
+    parser.add_argument("--buffer-seconds", type=float, default=10, help="Länge des Ringpuffers in Sekunden")
+    parser.add_argument("--print-every", type=float, default=10, help="Ausgabe-Intervall in Sekunden Aufnahmezeit")
+    asyncio.run(_replay(parser.parse_args()))
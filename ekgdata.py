@@ -1,91 +1,764 @@
 import json
+import os
+import time
 import pandas as pd
 import plotly.express as px
 import numpy as np
-from scipy.signal import find_peaks
+from scipy.interpolate import CubicSpline
+from scipy.ndimage import maximum_filter1d, uniform_filter1d
+from scipy.signal import butter, find_peaks, sosfiltfilt, welch
+
+EKG_COLUMNS = ['Messwerte in mV', 'Zeit in ms']
+EKG_CACHE_DIR = ".cache"  # Unterordner neben der Textdatei für die Binär-Sidecars
+PEAK_METHODS = ("percentile", "adaptive")  # Auswahl für EKGdata.find_peaks
+DEFAULT_PEAK_METHOD = "adaptive"  # Voreinstellung in der App (main.py) und in ekg_batch.py
+HRV_LF_BAND = (0.04, 0.15)  # Hz
+HRV_HF_BAND = (0.15, 0.4)
+HRV_RESAMPLE_HZ = 4  # gleichmäßige Abtastung der RR-Reihe für die Welch-PSD
+
+
+def _cache_paths(data_path):
+    """Pfade der Binär-Sidecars (Messwerte, Zeit, Metadaten) zu einer EKG-Textdatei"""
+    folder, filename = os.path.split(data_path)
+    base = os.path.join(folder, EKG_CACHE_DIR, os.path.splitext(filename)[0])
+    return base + ".mv.npy", base + ".ms.npy", base + ".meta.json"
+
+
+def _source_signature(data_path):
+    stat = os.stat(data_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _read_cache(data_path):
+    """Liefert (mV, ms) als memory-mapped Arrays oder None, wenn der Cache fehlt/veraltet ist"""
+    mv_path, ms_path, meta_path = _cache_paths(data_path)
+    try:
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if meta != _source_signature(data_path):
+            return None
+        return np.load(mv_path, mmap_mode="r"), np.load(ms_path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(data_path, values, times):
+    """Schreibt die Sidecars; Metadaten zuletzt, damit halbe Caches nie als gültig gelten"""
+    mv_path, ms_path, meta_path = _cache_paths(data_path)
+    try:
+        os.makedirs(os.path.dirname(mv_path), exist_ok=True)
+        for path, array in ((mv_path, values), (ms_path, times)):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as file:
+                np.save(file, array)
+            os.replace(tmp_path, path)
+        with open(meta_path + ".tmp", "w") as file:
+            json.dump(_source_signature(data_path), file)
+        os.replace(meta_path + ".tmp", meta_path)
+    except OSError:
+        pass  # z.B. schreibgeschütztes Datenverzeichnis – dann eben ohne Cache
+
+
+def compact_time_array(times):
+    """Ganzzahlige Zeiten (im int32-Bereich) als int32, sonst float64 – nie abschneiden"""
+    times = np.asarray(times)
+    integral = np.issubdtype(times.dtype, np.integer) or bool(np.all(np.mod(times, 1) == 0))
+    if integral and len(times) and np.iinfo(np.int32).min <= times.min() and times.max() <= np.iinfo(np.int32).max:
+        return times.astype(np.int32)
+    return times.astype(np.float64)
+
+
+def load_ekg_signal(data_path, use_cache=True):
+    """Liest eine EKG-Textdatei (Tab-getrennt) als DataFrame ein.
+
+    Beim ersten Einlesen wird ein kompakter Binär-Cache (float32 mV, int32 ms bzw. float64 ms
+    bei Bruchteilen von Millisekunden) angelegt, der anhand von Größe und Änderungszeit der
+    Quelldatei validiert und danach per memory mapping statt erneutem Text-Parsing geladen wird.
+    Fehlende Zeitwerte (NaN) -> unverändertes DataFrame ohne Cache.
+    """
+    cached = _read_cache(data_path) if use_cache else None
+    if cached is None:
+        df = pd.read_csv(data_path, sep='\t', header=None, names=EKG_COLUMNS)
+        times = df[EKG_COLUMNS[1]].to_numpy()
+        if np.isnan(times.astype(float)).any():
+            return df
+        values = df[EKG_COLUMNS[0]].to_numpy(dtype=np.float32)
+        times = compact_time_array(times)
+        if use_cache:
+            _write_cache(data_path, values, times)
+    else:
+        values, times = cached
+    return pd.DataFrame({EKG_COLUMNS[0]: values, EKG_COLUMNS[1]: times}, copy=False)
+
+
+class CompactSignal:
+    """Speichersparende Darstellung einer Aufnahme: Messwerte als zusammenhängendes float32-Array.
+
+    Ist die Abtastung gleichmäßig, wird die Zeit nur als Start + Index * Intervall gespeichert
+    (4 Byte pro Sample statt 8 wie im float32/int32-Cache von load_ekg_signal). Sonst
+    (z.B. 2/3-ms-Jitter oder Zeitsprünge wie in den mitgelieferten Aufnahmen) bleibt eine
+    int32-Zeitspalte erhalten – dann gibt es gegenüber dem Cache keine Ersparnis, nur
+    gegenüber einem float64/int64-DataFrame (z.B. aus einem CSV-Upload).
+    """
+
+    def __init__(self, values, times):
+        self.values = np.ascontiguousarray(values, dtype=np.float32)
+        times = np.asarray(times)
+        self.start_ms = times[0].item() if len(times) else 0
+        steps = np.diff(times)
+        self.interval_ms = steps[0].item() if len(steps) else 1.0
+        uniform = len(steps) == 0 or (self.interval_ms > 0 and np.allclose(steps, self.interval_ms, rtol=0, atol=1e-9))
+        # ganzzahlige Zeiten passen in int32, Kommazahlen bleiben float64 (float32 wäre zu ungenau)
+        self.times = None if uniform else np.ascontiguousarray(compact_time_array(times))
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def is_uniform(self):
+        return self.times is None
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + (0 if self.times is None else self.times.nbytes)
+
+    def times_ms(self, indices=None):
+        """Zeitpunkte in ms, für alle Samples oder nur für die angegebenen Indizes"""
+        if self.times is not None:
+            return self.times if indices is None else self.times[indices]
+        positions = np.arange(len(self.values)) if indices is None else np.asarray(indices)
+        return self.start_ms + positions * self.interval_ms
+
+    def to_dataframe(self):
+        return pd.DataFrame({EKG_COLUMNS[0]: self.values, EKG_COLUMNS[1]: self.times_ms()}, copy=False)
+
+
+def _minmax_indices(values, positions, n_buckets):
+    """Min/Max je Bucket über values[positions]; liefert Original-Indizes"""
+    n = len(positions)
+    if n <= 2 * n_buckets:
+        return positions
+    size = n // n_buckets
+    usable = size * n_buckets
+    blocks = values[positions[:usable]].reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    selected = [offsets + blocks.argmin(axis=1), offsets + blocks.argmax(axis=1), [0, n - 1]]
+    if usable < n:
+        tail = values[positions[usable:]]
+        selected.append([usable + tail.argmin(), usable + tail.argmax()])
+    return positions[np.unique(np.concatenate(selected))]
+
+
+def downsample_indices(x, y, max_points=4000, x_range=None):
+    """Wählt höchstens ~max_points Indizes für einen Linienplot aus (Min/Max je Bucket).
+
+    Da in jedem Bucket Minimum und Maximum erhalten bleiben, gehen R-Zacken nicht verloren.
+    Mit x_range bekommt der anfangs sichtbare Bereich die Hälfte des Budgets, der Rest
+    der Aufnahme (nur über Rangeslider/Zoom erreichbar) wird gröber dargestellt.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if x_range is None:
+        return _minmax_indices(y, np.arange(len(y)), max_points // 2)
+
+    visible = (x >= x_range[0]) & (x <= x_range[1])
+    inside = _minmax_indices(y, np.flatnonzero(visible), max_points // 4)
+    outside = _minmax_indices(y, np.flatnonzero(~visible), max_points // 4)
+    return np.sort(np.concatenate([inside, outside]))
+
+
+def peak_distance_samples(max_puls, sampling_rate):
+    """Mindestabstand zweier R-Zacken in Samples, abgeleitet aus dem Maximalpuls.
+
+    Gemeinsame Grundlage von EKGdata.find_peaks, stream_rr_intervals und ekg_live.LivePeakDetector.
+    """
+    sampling_interval = 1000 / sampling_rate
+    min_distance_ms = 60000 / max_puls
+    return int(min_distance_ms / sampling_interval)
+
+
+def detect_r_peaks(signal, distance, height):
+    """Lokale Maxima über height mit Mindestabstand distance; gleich hohe Peaks -> früherer gewinnt.
+
+    scipy find_peaks(distance=...) sortiert die Peaks instabil; bei gleich hohen Nachbarn hinge
+    das Ergebnis dann vom Signalausschnitt ab. So liefern find_peaks, stream_rr_intervals und
+    ekg_live für jeden Ausschnitt dieselben Peaks.
+    """
+    peaks, _ = find_peaks(signal, height=height)
+    return _select_by_distance(signal, peaks, distance)
+
+
+def _select_by_distance(signal, peaks, distance):
+    """Behält von zu nahen Peaks jeweils den höchsten, Gleichstand -> früherer Peak.
+
+    Die Peaks bekommen eindeutige Ränge (Höhe, dann Position); auf diesem Rang-Signal erledigt
+    scipy find_peaks die Abstandsauswahl kompiliert – ohne Python-Schleife.
+    """
+    if distance <= 1 or len(peaks) < 2:
+        return peaks
+
+    order = np.lexsort((-peaks, np.asarray(signal)[peaks]))
+    ranks = np.zeros(peaks[-1] + 2)
+    ranks[peaks[order]] = np.arange(1, len(peaks) + 1)
+    selected, _ = find_peaks(ranks, distance=distance)
+    return selected
+
+
+def detect_r_peaks_adaptive(signal, sampling_rate, distance, band_hz=(5, 15), integration_ms=150,
+                            level_window_s=2.0, threshold_ratio=0.3):
+    """R-Zacken-Erkennung nach Pan-Tompkins-Prinzip, vollständig vektorisiert.
+
+    Bandpass (entfernt Grundliniendrift und hochfrequentes Rauschen), Ableitung, Quadrierung
+    und gleitende Integration über integration_ms. Statt einer globalen Schwelle gilt eine
+    lokale: ein Kandidat zählt, wenn er threshold_ratio * Maximum der Integration im Fenster
+    level_window_s erreicht. Die R-Zacke wird danach im Originalsignal um den Kandidaten
+    gesucht (Plateaumitte wie scipy find_peaks) und der Mindestabstand wie bei detect_r_peaks
+    angewendet.
+    """
+    signal = np.asarray(signal, dtype=float)
+    if len(signal) < 3 * sampling_rate * integration_ms / 1000:
+        return np.array([], dtype=int)
+
+    sos = butter(2, band_hz, btype="band", fs=sampling_rate, output="sos")
+    filtered = sosfiltfilt(sos, signal)
+    window = max(int(integration_ms / 1000 * sampling_rate), 1)
+    integrated = uniform_filter1d(np.gradient(filtered) ** 2, window)
+    level = maximum_filter1d(integrated, max(int(level_window_s * sampling_rate), 1))
+
+    candidates, _ = find_peaks(integrated, distance=max(distance, 1))
+    candidates = candidates[integrated[candidates] >= threshold_ratio * level[candidates]]
+    if len(candidates) == 0:
+        return candidates
+
+    # Position im Originalsignal: Maximum im Suchfenster, bei Plateaus die Mitte
+    search = np.clip(candidates[:, None] + np.arange(-window, window + 1), 0, len(signal) - 1)
+    values = signal[search]
+    first = np.argmax(values, axis=1)
+    last = values.shape[1] - 1 - np.argmax(values[:, ::-1], axis=1)
+    peaks = np.unique(search[np.arange(len(candidates)), (first + last) // 2])
+    return _select_by_distance(signal, peaks, distance)
+
+
+def compare_peak_detectors(paths, max_puls=220, tolerance_ms=50):
+    """Genauigkeit und Laufzeit der eingebauten Detektoren im Vergleich zu NeuroKit2.
+
+    Referenz sind die R-Zacken aus nk.ecg_process (wie in der App). Ein Peak gilt als
+    getroffen, wenn eine Referenz-Zacke höchstens tolerance_ms entfernt liegt.
+    """
+    import neurokit2 as nk
+
+    rows = []
+    for path in paths:
+        ekg = EKGdata({"id": None, "date": None, "result_link": path}, max_puls=max_puls)
+        signal = ekg.signal_values
+        sampling_rate = ekg.sampling_rate
+
+        start = time.perf_counter()
+        _, info = nk.ecg_process(signal, sampling_rate=sampling_rate)
+        runtimes = {"neurokit": time.perf_counter() - start}
+        reference = np.asarray(info["ECG_R_Peaks"])
+        tolerance = tolerance_ms / 1000 * sampling_rate
+
+        row = {"file": path, "neurokit_peaks": len(reference), "neurokit_s": runtimes["neurokit"]}
+        for method in PEAK_METHODS:
+            ekg.peaks = None
+            start = time.perf_counter()
+            peaks = ekg.find_peaks(method=method)
+            runtime = time.perf_counter() - start
+
+            # nächste Referenz-Zacke je Peak und umgekehrt
+            hits = _count_matches(peaks, reference, tolerance)
+            found = _count_matches(reference, peaks, tolerance)
+            row.update({
+                f"{method}_peaks": len(peaks),
+                f"{method}_sensitivity": found / len(reference) if len(reference) else np.nan,
+                f"{method}_precision": hits / len(peaks) if len(peaks) else np.nan,
+                f"{method}_s": runtime,
+            })
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def _count_matches(peaks, reference, tolerance):
+    if len(peaks) == 0 or len(reference) == 0:
+        return 0
+    position = np.clip(np.searchsorted(reference, peaks), 1, len(reference) - 1)
+    nearest = np.minimum(np.abs(peaks - reference[position - 1]), np.abs(peaks - reference[position]))
+    return int(np.sum(nearest <= tolerance))
+
+
+def hrv_time_domain(rr_ms):
+    """Zeitbereichs-HRV aus RR-Intervallen (ms), Schlüssel wie bei nk.hrv_time"""
+    rr_ms = np.asarray(rr_ms, dtype=float)
+    if len(rr_ms) < 2:
+        return {"HRV_MeanNN": np.nan, "HRV_SDNN": np.nan, "HRV_RMSSD": np.nan, "HRV_pNN50": np.nan}
+    successive = np.diff(rr_ms)
+    return {
+        "HRV_MeanNN": rr_ms.mean(),
+        "HRV_SDNN": rr_ms.std(ddof=1),
+        "HRV_RMSSD": np.sqrt(np.mean(successive ** 2)),
+        "HRV_pNN50": 100 * np.mean(np.abs(successive) > 50),
+    }
+
+
+def hrv_frequency_domain(rr_ms, lf_band=HRV_LF_BAND, hf_band=HRV_HF_BAND, resample_hz=HRV_RESAMPLE_HZ):
+    """LF-/HF-Leistung (ms²) und LF/HF per Welch-PSD der gleichmäßig neu abgetasteten RR-Reihe.
+
+    Die Zeitachse ergibt sich aus der Summe der RR-Intervalle, Zeitsprünge in der Aufnahme
+    stören daher nicht. Für LF werden mindestens zwei Perioden der unteren Bandgrenze benötigt.
+    """
+    rr_ms = np.asarray(rr_ms, dtype=float)
+    result = {"HRV_LF": np.nan, "HRV_HF": np.nan, "HRV_LFHF": np.nan}
+    beat_times = np.cumsum(rr_ms) / 1000
+    if len(rr_ms) < 4 or beat_times[-1] - beat_times[0] < 2 / lf_band[0]:
+        return result
+
+    grid = np.arange(beat_times[0], beat_times[-1], 1 / resample_hz)
+    rr_even = CubicSpline(beat_times, rr_ms)(grid)
+    nperseg = min(len(grid), int(4 / lf_band[0] * resample_hz))  # ca. 100 s Segmente
+    freqs, psd = welch(rr_even, fs=resample_hz, nperseg=nperseg, detrend="linear")
+
+    def band_power(band):
+        mask = (freqs >= band[0]) & (freqs < band[1])
+        return np.trapezoid(psd[mask], freqs[mask]) if mask.sum() > 1 else np.nan
+
+    lf, hf = band_power(lf_band), band_power(hf_band)
+    result.update({"HRV_LF": lf, "HRV_HF": hf, "HRV_LFHF": lf / hf if hf > 0 else np.nan})
+    return result
+
+
+def rolling_hrv(rr_ms, start_ms=0, window_s=60, step_s=5):
+    """HR, SDNN und RMSSD in gleitenden Zeitfenstern, alle Fenster in einem Durchlauf.
+
+    Schlagzeiten ergeben sich aus start_ms plus der Summe der RR-Intervalle. Über kumulierte
+    Summen von RR, RR² und den quadrierten Nachfolger-Differenzen kostet jedes Fenster nur
+    zwei Indexsuchen, unabhängig von der Fensterlänge. Ein Intervall gehört zum Fenster,
+    in dem es endet; Fenster mit weniger als zwei Intervallen liefern NaN.
+    """
+    rr_ms = np.asarray(rr_ms, dtype=float)
+    columns = ["start_s", "end_s", "n_intervals", "hr_bpm", "sdnn_ms", "rmssd_ms"]
+    if len(rr_ms) == 0:
+        return pd.DataFrame(columns=columns)
+
+    beat_times = start_ms + np.cumsum(rr_ms)  # Ende jedes Intervalls
+    window_ms, step_ms = window_s * 1000, step_s * 1000
+    starts = np.arange(start_ms, max(beat_times[-1] - window_ms, start_ms) + step_ms / 2, step_ms)
+    lo = np.searchsorted(beat_times, starts, side="left")
+    hi = np.searchsorted(beat_times, starts + window_ms, side="left")
+    n = hi - lo
+
+    # um den Gesamtmittelwert verschoben, damit die Varianz aus Summen numerisch stabil bleibt
+    centered = rr_ms - rr_ms.mean()
+    cum_rr = np.concatenate([[0], np.cumsum(centered)])
+    cum_rr2 = np.concatenate([[0], np.cumsum(centered ** 2)])
+    cum_diff2 = np.concatenate([[0], np.cumsum(np.diff(rr_ms) ** 2)])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sums = cum_rr[hi] - cum_rr[lo]
+        mean_rr = sums / n + rr_ms.mean()
+        variance = (cum_rr2[hi] - cum_rr2[lo] - sums ** 2 / n) / (n - 1)
+        # Differenzen j = lo .. hi-2 (beide Intervalle im Fenster)
+        diff_sums = cum_diff2[np.maximum(hi - 1, lo)] - cum_diff2[lo]
+        rmssd = np.sqrt(diff_sums / (n - 1))
+
+    valid = n >= 2
+    return pd.DataFrame({
+        "start_s": starts / 1000,
+        "end_s": (starts + window_ms) / 1000,
+        "n_intervals": n,
+        "hr_bpm": np.where(valid, 60000 / mean_rr, np.nan),
+        "sdnn_ms": np.where(valid, np.sqrt(np.clip(variance, 0, None)), np.nan),
+        "rmssd_ms": np.where(valid, rmssd, np.nan),
+    }, columns=columns)
+
+
+def _percentile_from_counts(values, counts, q):
+    """Exaktes Perzentil (wie np.percentile, Methode 'linear') aus einem Werte-Histogramm"""
+    order = np.argsort(values)
+    values = np.asarray(values)[order]
+    cumulative = np.cumsum(np.asarray(counts)[order])
+    position = (cumulative[-1] - 1) * q / 100
+    lower = int(np.floor(position))
+    value_lower = values[np.searchsorted(cumulative, lower, side="right")]
+    value_upper = values[np.searchsorted(cumulative, min(lower + 1, cumulative[-1] - 1), side="right")]
+    return value_lower + (position - lower) * (value_upper - value_lower)
+
+
+class _StreamingHistogram:
+    """Werte-Histogramm mit begrenztem Speicher für Perzentile über beliebig lange Aufnahmen.
+
+    Solange alle Werte ganzzahlig sind und höchstens max_exact verschiedene vorkommen
+    (typisch für ADC-Messwerte in mV und Zeitabstände in ms), wird exakt gezählt und das
+    Perzentil stimmt mit np.percentile überein. Sonst wird auf n_bins gleich breite Klassen
+    umgestellt, deren Bereich sich bei Bedarf verdoppelt; das Perzentil ist dann auf etwa
+    eine Klassenbreite ((max - min) / n_bins) genau.
+    """
+
+    def __init__(self, max_exact=65536, n_bins=65536):
+        self.max_exact = max_exact
+        self.n_bins = n_bins
+        self.values = np.empty(0)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.low = None  # untere Grenze der Klassen, None solange exakt gezählt wird
+        self.width = None
+
+    def add(self, array):
+        array = np.asarray(array, dtype=float)
+        array = array[~np.isnan(array)]
+        if len(array) == 0:
+            return
+        if self.low is None:
+            if np.all(array == np.round(array)):
+                values, inverse = np.unique(np.concatenate([self.values, array]), return_inverse=True)
+                weights = np.concatenate([self.counts, np.ones(len(array), dtype=np.int64)])
+                counts = np.bincount(inverse, weights=weights, minlength=len(values)).astype(np.int64)
+                if len(values) <= self.max_exact:
+                    self.values, self.counts = values, counts
+                    return
+                self._switch_to_bins(values, counts)
+                return
+            self._switch_to_bins(self.values, self.counts)
+        self._add_binned(array, np.ones(len(array), dtype=np.int64))
+
+    def _switch_to_bins(self, values, counts):
+        self.low = values.min() if len(values) else 0.0
+        self.width = None
+        self.counts = np.zeros(self.n_bins, dtype=np.int64)
+        self.values = np.empty(0)
+        if len(values):
+            self._add_binned(values, counts)
+
+    def _add_binned(self, array, weights):
+        low, high = array.min(), array.max()
+        if self.width is None:
+            self.low = min(self.low, low)
+            self.width = max(high - self.low, 1e-12) / (self.n_bins - 1)
+        # Bereich verdoppeln (je zwei Klassen zusammenfassen), bis alle Werte hineinpassen
+        while low < self.low or high >= self.low + self.n_bins * self.width:
+            merged = self.counts.reshape(-1, 2).sum(axis=1)
+            half = np.zeros(self.n_bins // 2, dtype=np.int64)
+            if low < self.low:
+                self.counts = np.concatenate([half, merged])
+                self.low -= self.n_bins * self.width
+            else:
+                self.counts = np.concatenate([merged, half])
+            self.width *= 2
+        bins = np.minimum(((array - self.low) / self.width).astype(np.int64), self.n_bins - 1)
+        self.counts += np.bincount(bins, weights=weights, minlength=self.n_bins).astype(np.int64)
+
+    def percentile(self, q):
+        if self.low is None:
+            return _percentile_from_counts(self.values, self.counts, q)
+        cumulative = np.cumsum(self.counts)
+        position = (cumulative[-1] - 1) * q / 100
+        index = np.searchsorted(cumulative, position, side="right")
+        before = cumulative[index - 1] if index > 0 else 0
+        fraction = (position - before + 0.5) / self.counts[index]
+        return self.low + (index + fraction) * self.width
+
+
+def _read_ekg_chunks(data_path, chunk_size):
+    return pd.read_csv(data_path, sep='\t', header=None, names=EKG_COLUMNS, chunksize=chunk_size)
+
+
+def streaming_statistics(data_path, chunk_size=100_000, need_height=True):
+    """Erster Durchlauf: Sampling-Rate (Median der Zeitabstände) und 90%-Perzentil der Messwerte.
+
+    Die Werte werden in _StreamingHistogram gezählt, der Speicherbedarf hängt daher nur von
+    der Blockgröße ab. Bei ganzzahligen Daten (wie den mitgelieferten Aufnahmen) sind die
+    Ergebnisse identisch zur In-Memory-Berechnung, bei Kommawerten auf eine Klassenbreite genau.
+    """
+    value_histogram, diff_histogram = _StreamingHistogram(), _StreamingHistogram()
+    last_time = None
+    for chunk in _read_ekg_chunks(data_path, chunk_size):
+        times = chunk["Zeit in ms"].values
+        if last_time is not None:
+            times = np.concatenate([[last_time], times])
+        diff_histogram.add(np.diff(times))
+        last_time = times[-1]
+        if need_height:
+            value_histogram.add(chunk["Messwerte in mV"].values)
+
+    sampling_interval = diff_histogram.percentile(50)
+    height = value_histogram.percentile(90) if need_height else None
+    return 1000 / sampling_interval, height
+
+
+def stream_rr_intervals(data_path, max_puls=220, height=None, sampling_rate=None,
+                        chunk_size=100_000, overlap_factor=8):
+    """Peak-Erkennung in festen Blöcken für sehr lange Aufnahmen (z.B. Holter-EKG).
+
+    Jeder Block wird mit overlap_factor * Mindestabstand Samples Kontext auf beiden Seiten
+    ausgewertet; ausgegeben werden nur Peaks, deren Umgebung vollständig gelesen wurde.
+    Liefert pro Block ein Dictionary mit globalen Peak-Indizes, Peak-Zeiten und den
+    RR-Intervallen (ms), inklusive des Intervalls über die Blockgrenze hinweg.
+    Das Ergebnis ist unabhängig von chunk_size und gleich dem von EKGdata.find_peaks.
+    """
+    if sampling_rate is None or height is None:
+        detected_rate, detected_height = streaming_statistics(data_path, chunk_size, need_height=height is None)
+        sampling_rate = sampling_rate or detected_rate
+        height = detected_height if height is None else height
+
+    distance_samples = peak_distance_samples(max_puls, sampling_rate)
+    margin = max(overlap_factor * distance_samples, 1)
+
+    buffer_values = np.empty(0)
+    buffer_times = np.empty(0)
+    buffer_start = 0  # globaler Index des ersten Samples im Puffer
+    emitted_until = 0  # Peaks mit kleinerem globalen Index wurden bereits ausgegeben
+    last_peak_time = None
+
+    chunks = _read_ekg_chunks(data_path, chunk_size)
+    chunk = next(chunks, None)
+    while chunk is not None:
+        next_chunk = next(chunks, None)
+        is_last = next_chunk is None
+
+        buffer_values = np.concatenate([buffer_values, chunk["Messwerte in mV"].values])
+        buffer_times = np.concatenate([buffer_times, chunk["Zeit in ms"].values])
+        buffer_end = buffer_start + len(buffer_values)
+        confirmed_until = buffer_end if is_last else buffer_end - margin
+
+        if confirmed_until > emitted_until:
+            local_peaks = detect_r_peaks(buffer_values, distance_samples, height)
+            global_peaks = local_peaks + buffer_start
+            keep = (global_peaks >= emitted_until) & (global_peaks < confirmed_until)
+            peaks = global_peaks[keep]
+            peak_times = buffer_times[local_peaks[keep]]
+
+            with_previous = peak_times if last_peak_time is None else np.concatenate([[last_peak_time], peak_times])
+            if len(peak_times) > 0:
+                last_peak_time = peak_times[-1]
+            emitted_until = confirmed_until
+
+            yield {"peaks": peaks, "peak_times_ms": peak_times, "rr_ms": np.diff(with_previous).astype(float)}
+
+            # Nur den Kontext vor dem noch offenen Bereich behalten
+            trim = max(emitted_until - margin - buffer_start, 0)
+            buffer_values = buffer_values[trim:]
+            buffer_times = buffer_times[trim:]
+            buffer_start += trim
+
+        chunk = next_chunk
+
 
 class EKGdata:
 
-    def __init__(self, ekg_dict, max_puls=220):  ### NEU: max_puls übergeben
+    def __init__(self, ekg_dict, max_puls=220, peak_method="percentile", compact=False):  ### NEU: max_puls übergeben
         self.id = ekg_dict["id"]
         self.date = ekg_dict["date"]
         self.data_path = ekg_dict["result_link"]
-        self.df = pd.read_csv(self.data_path, sep='\t', header=None, names=['Messwerte in mV', 'Zeit in ms'])
+        self.peak_method = peak_method  # Standard-Detektor für find_peaks (siehe PEAK_METHODS)
         self.peaks = None
+        self._peak_params = None
+        self._rr = None
 
-        time = self.df["Zeit in ms"].values
-        sampling_interval = np.median(np.diff(time))
-        self.sampling_rate = 1000 / sampling_interval
+        # Messdaten werden erst beim ersten Zugriff auf df/sampling_rate eingelesen
+        self._df = None
+        self._sampling_rate = None
+        # compact=True: nur CompactSignal im Speicher, df wird bei Bedarf daraus erzeugt
+        self.compact = compact
+        self._signal = None
 
         self.max_puls = max_puls  ### NEU: Maximalpuls als Attribut speichern
 
-    def plot_time_series(self):
-        fig = px.line(self.df.head(2000), x="Zeit in ms", y="Messwerte in mV", title="EKG Zeitreihe")
+    @classmethod
+    def from_dataframe(cls, df, ekg_id=None, date=None, max_puls=220, compact=False):
+        """Erzeugt ein EKGdata-Objekt aus einem bereits eingelesenen DataFrame (z.B. Upload)"""
+        ekg = cls({"id": ekg_id, "date": date, "result_link": None}, max_puls=max_puls, compact=compact)
+        ekg.df = df
+        return ekg
+
+    @property
+    def is_loaded(self):
+        return self._df is not None or self._signal is not None
+
+    @property
+    def df(self):
+        """Messdaten als DataFrame; im Kompaktmodus nur für Abwärtskompatibilität beim ersten
+        Zugriff aus dem CompactSignal erzeugt – intern werden signal_values und times_ms() verwendet."""
+        if self._df is None and self.compact:
+            self._df = self.signal.to_dataframe()
+        if self._df is None:
+            self._df = load_ekg_signal(self.data_path)
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        if self.compact:
+            self._signal = CompactSignal(df[EKG_COLUMNS[0]].values, df[EKG_COLUMNS[1]].values)
+            self._df = None
+        else:
+            self._df = df
+            self._signal = None
+        # Peaks und Schlag-Analyse gehören zum alten Signal
+        self._sampling_rate = None
+        self.peaks = None
+        self._peak_params = None
+        self._rr = None
+
+    @property
+    def signal(self):
+        """Kompakte Darstellung der Aufnahme (wird im Kompaktmodus beim ersten Zugriff geladen)"""
+        if self._signal is None:
+            df = self._df if self._df is not None else load_ekg_signal(self.data_path)
+            self._signal = CompactSignal(df[EKG_COLUMNS[0]].values, df[EKG_COLUMNS[1]].values)
+        return self._signal
+
+    @property
+    def signal_values(self):
+        """Messwerte in mV als NumPy-Array (ohne DataFrame-Umweg)"""
+        if self.compact:
+            return self.signal.values
+        return self.df[EKG_COLUMNS[0]].values
+
+    def times_ms(self, indices=None):
+        """Zeitpunkte in ms, für alle Samples oder nur für die angegebenen Indizes"""
+        if self.compact:
+            return self.signal.times_ms(indices)
+        times = self.df[EKG_COLUMNS[1]].values
+        return times if indices is None else times[indices]
+
+    @property
+    def sampling_rate(self):
+        if self._sampling_rate is None:
+            if self.compact and self.signal.is_uniform:
+                sampling_interval = self.signal.interval_ms
+            else:
+                sampling_interval = np.median(np.diff(self.times_ms()))
+            self._sampling_rate = 1000 / sampling_interval
+        return self._sampling_rate
+
+    @sampling_rate.setter
+    def sampling_rate(self, sampling_rate):
+        self._sampling_rate = sampling_rate
+
+    def _plot_frame(self, indices):
+        """Kleiner DataFrame nur mit den zu zeichnenden Samples"""
+        return pd.DataFrame({EKG_COLUMNS[0]: self.signal_values[indices], EKG_COLUMNS[1]: self.times_ms(indices)})
+
+    def plot_time_series(self, max_points=4000):
+        time = self.times_ms()
+        start_time, end_time = time[0], time[min(len(time), 2000) - 1]
+        idx = downsample_indices(time, self.signal_values, max_points, (start_time, end_time))
+        fig = px.line(self._plot_frame(idx), x="Zeit in ms", y="Messwerte in mV", title="EKG Zeitreihe")
+        fig.update_layout(xaxis=dict(range=[start_time, end_time]))
         return fig
 
-    def find_peaks(self, max_puls=None, height=None):
+    def find_peaks(self, max_puls=None, height=None, method=None):
+        """R-Zacken suchen; method 'percentile' (feste Schwelle, 90%-Perzentil bzw. height)
+        oder 'adaptive' (Bandpass + lokale Schwelle, robust gegen Grundliniendrift)."""
         if max_puls is None:
             max_puls = self.max_puls  ### NEU: Standard ist self.max_puls
-
-        signal = self.df["Messwerte in mV"]
-        time = self.df["Zeit in ms"]
-        sampling_interval = 1000 / self.sampling_rate
-
-        min_distance_ms = 60000 / max_puls
-        distance_samples = int(min_distance_ms / sampling_interval)
-
-        if height is None:
-            height = np.percentile(signal, 90)
-
-        peaks, _ = find_peaks(signal, distance=distance_samples, height=height)
+        method = method or self.peak_method
+        if method not in PEAK_METHODS:
+            raise ValueError(f"Unbekannte Peak-Methode: {method} (erlaubt: {', '.join(PEAK_METHODS)})")
+
+        # Gleiche Parameter wie beim letzten Aufruf -> vorhandene Peaks (und RR-Analyse) weiterverwenden
+        if self.peaks is not None and self._peak_params == (max_puls, height, method):
+            return self.peaks
+
+        signal = self.signal_values
+        distance_samples = peak_distance_samples(max_puls, self.sampling_rate)
+
+        if method == "adaptive":
+            peaks = detect_r_peaks_adaptive(signal, self.sampling_rate, distance_samples)
+        else:
+            if height is None:
+                detect_height = np.percentile(signal, 90)
+            else:
+                detect_height = height
+            peaks = detect_r_peaks(signal, distance_samples, detect_height)
 
         self.peaks = peaks
-        self.df["Peak"] = 0
-        self.df.loc[peaks, "Peak"] = 1
+        self._peak_params = (max_puls, height, method)
+        self._rr = None  # RR-Analyse gehört zu den alten Peaks
 
         return peaks
 
-    def estimate_hr(self):
+    def rr_analysis(self):
+        """Einmal berechnete Schlag-Analyse, die alle HR/RR-Methoden gemeinsam nutzen.
+
+        Enthält Peak-Indizes, Peak-Zeiten (ms), RR-Intervalle (ms) und die instantane
+        Herzfrequenz (bpm). Wird verworfen, sobald find_peaks neue Peaks liefert.
+        """
         if self.peaks is None:
             self.find_peaks()
 
-        time = self.df["Zeit in ms"].values
-        peak_times = time[self.peaks] / 1000
-        rr_intervals = np.diff(peak_times)
+        if self._rr is None:
+            peak_times = self.times_ms(self.peaks)
+            rr_intervals = np.diff(peak_times).astype(float)
+            self._rr = {
+                "peaks": self.peaks,
+                "peak_times_ms": peak_times,
+                "rr_ms": rr_intervals,
+                "instant_hr": 60000 / rr_intervals if len(rr_intervals) > 0 else np.array([]),
+            }
+        return self._rr
+
+    def hrv_metrics(self):
+        """SDNN, RMSSD, pNN50 und LF/HF aus den RR-Intervallen, einmal pro Peak-Satz berechnet.
+
+        Nicht-positive Intervalle (Zeitsprünge in der Aufnahme) werden verworfen.
+        Schlüssel wie bei NeuroKit2 (HRV_SDNN, HRV_RMSSD, HRV_pNN50, HRV_LF, HRV_HF, HRV_LFHF).
+        """
+        rr = self.rr_analysis()
+        if "hrv" not in rr:
+            rr_ms = rr["rr_ms"][rr["rr_ms"] > 0]
+            rr["hrv"] = {**hrv_time_domain(rr_ms), **hrv_frequency_domain(rr_ms)}
+        return rr["hrv"]
+
+    def rolling_hrv(self, window_s=60, step_s=5):
+        """HRV-Verlauf (HR, SDNN, RMSSD) in gleitenden Fenstern als DataFrame, pro Peak-Satz gecacht.
+
+        start_s/end_s sind Aufnahmezeit in Sekunden (gleiche Achse wie "Zeit in ms"), beginnend
+        beim ersten Peak; nicht-positive Intervalle werden wie bei hrv_metrics verworfen.
+        """
+        rr = self.rr_analysis()
+        cache = rr.setdefault("rolling_hrv", {})
+        if (window_s, step_s) not in cache:
+            rr_ms = rr["rr_ms"][rr["rr_ms"] > 0]
+            start_ms = float(rr["peak_times_ms"][0]) if len(rr["peak_times_ms"]) else 0.0
+            cache[(window_s, step_s)] = rolling_hrv(rr_ms, start_ms, window_s, step_s)
+        return cache[(window_s, step_s)]
+
+    def stream_rr_intervals(self, chunk_size=100_000):
+        """Blockweise RR-Analyse direkt aus der Datei, ohne das Signal komplett zu laden"""
+        return stream_rr_intervals(self.data_path, max_puls=self.max_puls, chunk_size=chunk_size)
+
+    def get_peak_points(self):
+        """Zeiten (ms) und Messwerte (mV) der Peaks per direktem Index-Zugriff"""
+        if self.peaks is None:
+            self.find_peaks()
+        return self.times_ms(self.peaks), self.signal_values[self.peaks]
+
+    def estimate_hr(self):
+        rr_intervals = self.rr_analysis()["rr_ms"]
 
         if len(rr_intervals) == 0:
             return 0
 
-        avg_rr = np.mean(rr_intervals)
+        avg_rr = np.mean(rr_intervals) / 1000
         heart_rate = 60 / avg_rr
         return round(heart_rate)
 
     def get_instant_hr(self):
-        if self.peaks is None:
-            self.find_peaks()
+        return self.rr_analysis()["instant_hr"]
 
-        time = self.df["Zeit in ms"].values
-        peak_times = time[self.peaks] / 1000
-        rr_intervals = np.diff(peak_times)
-
-        if len(rr_intervals) == 0:
-            return np.array([])
-
-        instant_hr = 60 / rr_intervals
-        return instant_hr
-
-    def plot_with_peaks(self, window_ms=5000):
+    def plot_with_peaks(self, window_ms=5000, max_points=4000):
         if self.peaks is None:
             self.find_peaks()
 
-        df_plot = self.df
+        time = self.times_ms()
+        start_time = time[0]
+        end_time = start_time + window_ms
+
+        idx = downsample_indices(time, self.signal_values, max_points, (start_time, end_time))
+        df_plot = self._plot_frame(idx)
         fig = px.line(df_plot, x="Zeit in ms", y="Messwerte in mV", title="EKG mit Peaks")
-        peak_points = df_plot[df_plot["Peak"] == 1]
-        fig.add_scatter(x=peak_points["Zeit in ms"], y=peak_points["Messwerte in mV"],
-                        mode="markers", name="Peaks")
+        peak_times, peak_values = self.get_peak_points()
+        fig.add_scatter(x=peak_times, y=peak_values, mode="markers", name="Peaks")
 
-        start_time = df_plot["Zeit in ms"].iloc[0]
-        end_time = start_time + window_ms
         fig.update_layout(
             xaxis=dict(
                 range=[start_time, end_time],
@@ -102,23 +775,13 @@ class EKGdata:
         return round(np.min(instant_hr))
 
     def hr_variability(self):
-        if self.peaks is None:
-            self.find_peaks()
-
-        time = self.df["Zeit in ms"].values
-        peak_times = time[self.peaks]
-        rr_intervals = np.diff(peak_times)
+        rr_intervals = self.rr_analysis()["rr_ms"]
         if len(rr_intervals) == 0:
             return 0
         return round(np.std(rr_intervals), 2)
 
     def rr_interval_avg(self):
-        if self.peaks is None:
-            self.find_peaks()
-
-        time = self.df["Zeit in ms"].values
-        peak_times = time[self.peaks]
-        rr_intervals = np.diff(peak_times)
+        rr_intervals = self.rr_analysis()["rr_ms"]
         if len(rr_intervals) == 0:
             return 0
         return round(np.mean(rr_intervals), 2)
@@ -127,12 +790,7 @@ class EKGdata:
         return self.rr_interval_avg()
 
     def detect_irregularities(self, tolerance=0.1):
-        if self.peaks is None:
-            self.find_peaks()
-
-        time = self.df["Zeit in ms"].values
-        peak_times = time[self.peaks]
-        rr_intervals = np.diff(peak_times)
+        rr_intervals = self.rr_analysis()["rr_ms"]
 
         if len(rr_intervals) < 2:
             return {"irregular_rr": False, "irregular_pp": False}
@@ -147,12 +805,7 @@ class EKGdata:
         }
 
     def qrs_analysis(self):
-        if self.peaks is None:
-            self.find_peaks()
-
-        time = self.df["Zeit in ms"].values
-        peak_times = time[self.peaks]
-        rr_intervals = np.diff(peak_times)
+        rr_intervals = self.rr_analysis()["rr_ms"]
 
         if len(rr_intervals) == 0:
             return {
@@ -169,6 +822,16 @@ class EKGdata:
         }
 
 if __name__ == "__main__":
+    import glob
+    import sys
+
+    # Vergleich der Detektoren mit NeuroKit2: python ekgdata.py compare [dateien...]
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        paths = sys.argv[2:] or sorted(glob.glob("data/ekg_data/*.txt"))
+        paths = [p for p in paths if not os.path.basename(p).lower().startswith("readme")]
+        print(compare_peak_detectors(paths).to_string(index=False))
+        sys.exit(0)
+
     print("This is a module with some functions to read the EKG data")
     with open("data/person_db.json") as file:
         person_data = json.load(file)
@@ -0,0 +1,132 @@
+import argparse
+import glob
+import hashlib
+import os
+
+import pandas as pd
+
+import read_fit_file
+from batch_utils import record_error, run_parallel
+
+ACTIVITY_STORE_DIR = "data/activity_store"
+SUMMARY_FILE = "summary.parquet"
+RECORDS_DIR = "records"
+
+
+def find_fit_files(folder):
+    """Alle .fit-Dateien eines Ordners (rekursiv, Groß-/Kleinschreibung egal)"""
+    paths = glob.glob(os.path.join(folder, "**", "*"), recursive=True)
+    return sorted(p for p in paths if p.lower().endswith(".fit") and os.path.isfile(p))
+
+
+def load_summary(store_dir=ACTIVITY_STORE_DIR):
+    """Übersichtstabelle aller importierten Aktivitäten (leer, falls noch nichts importiert)"""
+    path = os.path.join(store_dir, SUMMARY_FILE)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_parquet(path)
+
+
+def load_records(activity_id, store_dir=ACTIVITY_STORE_DIR):
+    """Gespeicherte record-Spalten einer Aktivität, ohne die FIT-Datei erneut zu dekodieren"""
+    return pd.read_parquet(os.path.join(store_dir, RECORDS_DIR, f"{activity_id}.parquet"))
+
+
+def import_fit_file(task):
+    """Dekodiert eine FIT-Datei, speichert die Records und liefert die Übersichtszeile.
+
+    activity_id ist der SHA-256 des Dateiinhalts und wird von bulk_import mitgegeben.
+    """
+    path, store_dir, activity_id = task["path"], task["store_dir"], task["activity_id"]
+    row = {"activity_id": activity_id, "source_path": path, "error": None}
+    with record_error(row):  # eine defekte Datei soll nicht den ganzen Import abbrechen
+        # Records und session/lap-Zusammenfassungen in einem Durchlauf dekodieren
+        df, summaries = read_fit_file.read_fit_activity(path)
+        if df.empty:
+            row["error"] = "Keine record-Daten"
+            return row
+        row.update(read_fit_file.merge_summaries(
+            read_fit_file.summarize_records(df),
+            read_fit_file.summarize_sessions(summaries["session"]),
+            read_fit_file.summarize_sessions(summaries["lap"])))
+        records_path = os.path.join(store_dir, RECORDS_DIR, f"{activity_id}.parquet")
+        df.to_parquet(records_path + ".tmp", index=False)
+        os.replace(records_path + ".tmp", records_path)
+    return row
+
+
+def summarize_fit_file(path):
+    """Übersichtszeile aus den session-Nachrichten, ohne die record-Daten zu dekodieren.
+
+    Fehlende Felder werden feldweise aus den lap-Nachrichten ergänzt; bleibt danach noch
+    etwas offen, werden nur die dafür nötigen record-Felder dekodiert.
+    """
+    row = {"source_path": path, "error": None}
+    with record_error(row):
+        summaries = read_fit_file.read_fit_summaries(path)
+        summary = read_fit_file.merge_summaries(
+            read_fit_file.summarize_sessions(summaries["session"]),
+            read_fit_file.summarize_sessions(summaries["lap"]))
+        missing = read_fit_file.missing_fields(summary) if summary else list(read_fit_file.SUMMARY_RECORD_FIELDS)
+        if missing:
+            # nur die record-Felder dekodieren, die für die fehlenden Kennzahlen nötig sind
+            records = read_fit_file.read_fit_file(path, fields=read_fit_file.record_fields_for(missing))
+            summary = read_fit_file.merge_summaries(summary, read_fit_file.summarize_records(records))
+        row.update(summary)
+    return row
+
+
+def list_activities(folder, max_workers=None):
+    """Schnelle Übersicht aller FIT-Dateien eines Ordners ohne Import (Aufwand je Datei, nicht je Sample)"""
+    return pd.DataFrame(run_parallel(summarize_fit_file, find_fit_files(folder), max_workers))
+
+
+def _file_hash(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def bulk_import(folder, store_dir=ACTIVITY_STORE_DIR, max_workers=None, reimport=False):
+    """Importiert alle FIT-Dateien eines Ordners parallel in den Aktivitäts-Speicher.
+
+    Bereits importierte Dateien (gleicher Inhalt) werden übersprungen, außer bei reimport=True.
+    Liefert die aktualisierte Übersichtstabelle.
+    """
+    os.makedirs(os.path.join(store_dir, RECORDS_DIR), exist_ok=True)
+    summary = load_summary(store_dir)
+    done = set() if reimport or summary.empty else set(summary.loc[summary["error"].isna(), "activity_id"])
+
+    # Jede Datei wird genau einmal gehasht; der Hash dient als activity_id im Auftrag
+    hashes = ((p, _file_hash(p)) for p in find_fit_files(folder))
+    tasks = [{"path": p, "store_dir": store_dir, "activity_id": digest}
+             for p, digest in hashes if digest not in done]
+    rows = run_parallel(import_fit_file, tasks, max_workers)
+
+    if rows:
+        new_rows = pd.DataFrame(rows)
+        summary = pd.concat([summary, new_rows], ignore_index=True) if not summary.empty else new_rows
+        summary = summary.drop_duplicates("activity_id", keep="last").reset_index(drop=True)
+        summary_path = os.path.join(store_dir, SUMMARY_FILE)
+        summary.to_parquet(summary_path + ".tmp", index=False)
+        os.replace(summary_path + ".tmp", summary_path)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-Import von FIT-Dateien in den Aktivitäts-Speicher")
+    parser.add_argument("folder", nargs="?", default="data/fit_file", help="Ordner mit .fit-Dateien")
+    parser.add_argument("--store", default=ACTIVITY_STORE_DIR, help="Zielordner des Aktivitäts-Speichers")
+    parser.add_argument("--workers", type=int, default=None, help="Anzahl Prozesse (Standard: CPU-Anzahl)")
+    parser.add_argument("--reimport", action="store_true", help="Bereits importierte Dateien erneut dekodieren")
+    parser.add_argument("--summary-only", action="store_true",
+                        help="Nur Übersicht aus den session-Nachrichten anzeigen, nichts importieren")
+    args = parser.parse_args()
+
+    if args.summary_only:
+        overview = list_activities(args.folder, max_workers=args.workers)
+        print(overview.to_string(index=False))
+        raise SystemExit
+
+    summary = bulk_import(args.folder, args.store, max_workers=args.workers, reimport=args.reimport)
+    print(f"{len(summary)} Aktivitäten im Speicher {args.store}")
+    print(summary.drop(columns=["activity_id"]).to_string(index=False))
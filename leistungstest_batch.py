@@ -0,0 +1,78 @@
+import argparse
+import glob
+import os
+
+import pandas as pd
+
+import read_pandas
+from batch_utils import record_error, run_parallel
+
+
+def find_activity_files(pattern):
+    """Verzeichnis (alle *.csv darin) oder Glob-Muster in eine sortierte Dateiliste auflösen"""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.csv")
+    return sorted(glob.glob(pattern))
+
+
+def load_athletes(path):
+    """Athletendaten je Datei (Spalten: file, weight, age, resting_hr, optional max_hr)"""
+    athletes = pd.read_csv(path)
+    athletes["file"] = athletes["file"].map(lambda f: os.path.splitext(os.path.basename(f))[0])
+    return athletes.set_index("file").to_dict(orient="index")
+
+
+def build_tasks(files, athletes, defaults):
+    tasks = []
+    for path in files:
+        params = dict(defaults)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        params.update({k: v for k, v in athletes.get(stem, {}).items() if pd.notna(v)})
+        tasks.append({"path": path, **params})
+    return tasks
+
+
+def analyse_activity(task):
+    """Leistungsanalyse + Zonenstatistik einer Aktivität als eine Tabellenzeile"""
+    row = {"file": task["path"], "weight_kg": task["weight"], "age": task["age"],
+           "resting_hr": task["resting_hr"], "error": None}
+    with record_error(row):  # eine fehlerhafte Datei soll nicht den ganzen Batch abbrechen
+        df = read_pandas.read_my_csv(task["path"])
+        results = read_pandas.leistungsanalyse(df, task["weight"], task["age"], task["resting_hr"])
+        results.pop("zone_stats")
+        row.update(results)
+
+        # Zonen wie im Leistungstest-Tab: vorgegebene max. HF, sonst Maximum der Aktivität
+        max_hr = task.get("max_hr") or results["max_hr"]
+        row["zone_max_hr"] = max_hr
+        zone_stats = read_pandas.zone_statistics(df, read_pandas.get_zone_limit(max_hr))
+        for zone, stats in zone_stats.iterrows():
+            row[f"{zone}_min"] = stats["duration_min"]
+            row[f"{zone}_avg_power"] = stats["avg_power"]
+    return row
+
+
+def batch_analyse(tasks, max_workers=None):
+    """Wertet alle Aktivitäten parallel in einem Prozess-Pool aus und liefert einen DataFrame"""
+    return pd.DataFrame(run_parallel(analyse_activity, tasks, max_workers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-Auswertung von Leistungstests (Aktivitäts-CSVs)")
+    parser.add_argument("input", nargs="?", default="data/activities", help="Verzeichnis oder Glob-Muster der CSV-Dateien")
+    parser.add_argument("--athletes", help="CSV mit Spalten file, weight, age, resting_hr (optional max_hr)")
+    parser.add_argument("--weight", type=float, default=70, help="Standard-Gewicht in kg")
+    parser.add_argument("--age", type=int, default=30, help="Standard-Alter in Jahren")
+    parser.add_argument("--resting-hr", type=int, default=60, help="Standard-Ruhepuls in bpm")
+    parser.add_argument("--max-hr", type=int, default=None, help="Max. HF für die Zonen (Standard: Maximum je Datei)")
+    parser.add_argument("--output", default="leistungstest_summary.csv", help="Ausgabedatei (CSV)")
+    parser.add_argument("--workers", type=int, default=None, help="Anzahl Prozesse (Standard: CPU-Anzahl)")
+    args = parser.parse_args()
+
+    files = find_activity_files(args.input)
+    athletes = load_athletes(args.athletes) if args.athletes else {}
+    defaults = {"weight": args.weight, "age": args.age, "resting_hr": args.resting_hr, "max_hr": args.max_hr}
+
+    summary = batch_analyse(build_tasks(files, athletes, defaults), max_workers=args.workers)
+    summary.to_csv(args.output, index=False)
+    print(f"{len(summary)} Aktivitäten ausgewertet, Ergebnis gespeichert in {args.output}")
@@ -1,3 +1,4 @@
+import hashlib
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -8,12 +9,28 @@ import read_data
 import read_pandas
 from PIL import Image
 from person import Person
-from ekgdata import EKGdata
+from ekgdata import DEFAULT_PEAK_METHOD, EKGdata, PEAK_METHODS, downsample_indices
 from streamlit_folium import st_folium
 import read_fit_file
 import neurokit2 as nk
 
 DEFAULT_IMAGE_PATH = "data/pictures/none.jpg"
+NEUROKIT_CACHE_ENTRIES = 16  # max. Anzahl zwischengespeicherter NeuroKit2-Auswertungen (LRU)
+
+
+@st.cache_data(max_entries=NEUROKIT_CACHE_ENTRIES, show_spinner="NeuroKit2 Analyse läuft...")
+def run_neurokit_analysis(recording_key, sampling_rate, _signal):
+    """NeuroKit2-Verarbeitung + HRV, zwischengespeichert pro (Aufnahme, Sampling-Rate).
+
+    recording_key ist der Dateipfad bzw. ein Hash des Upload-Inhalts; das Signal selbst
+    (Unterstrich-Parameter) wird von Streamlit nicht gehasht.
+    """
+    processed, info = nk.ecg_process(_signal, sampling_rate=sampling_rate)
+    rpeaks = info["ECG_R_Peaks"]
+    hrv_time = nk.hrv_time(rpeaks, sampling_rate=sampling_rate, show=False)
+    hrv_freq = nk.hrv_frequency(rpeaks, sampling_rate=sampling_rate, show=False)
+    return processed, info, hrv_time, hrv_freq
+
 
 # Tabs als Registerkarten oben
 tab1, tab2, tab3, tab4 = st.tabs(["👤 Versuchsperson", "🫀 EKG-Daten", "🚴 Leistungstest", "🏋️ Fit File"])
@@ -46,6 +63,15 @@ with tab1:
 with tab2:
     st.header("🫀 EKG-Datenanalyse")
 
+    # Adaptive Erkennung ist robust gegen Grundliniendrift (Belastungs-EKGs)
+    peak_method = st.radio(
+        "R-Zacken-Erkennung",
+        options=PEAK_METHODS,
+        index=PEAK_METHODS.index(DEFAULT_PEAK_METHOD),
+        format_func={"percentile": "Feste Schwelle (90%-Perzentil)", "adaptive": "Adaptiv (Pan-Tompkins)"}.get,
+        horizontal=True,
+    )
+
     # Upload eigener EKG-Daten
     uploaded_file = st.file_uploader(
         "Oder eigene EKG-Daten hochladen (CSV, Spalten: 'Messwerte in mV', 'Zeit in ms')",
@@ -61,20 +87,12 @@ with tab2:
             if not {'Messwerte in mV', 'Zeit in ms'}.issubset(df_uploaded.columns):
                 st.error("Die CSV muss die Spalten 'Messwerte in mV' und 'Zeit in ms' enthalten.")
             else:
-                # Sampling-Rate bestimmen
-                time = df_uploaded["Zeit in ms"].values
-                sampling_interval = np.median(np.diff(time))
-                sampling_rate = 1000 / sampling_interval
-
-                # EKGdata-Objekt für Upload erzeugen (ohne Konstruktor)
-                ekg = EKGdata.__new__(EKGdata)
-                ekg.df = df_uploaded
-                ekg.sampling_rate = sampling_rate
-                ekg.peaks = None
-                ekg.max_puls = 220  # Default Max-Puls, kann man anpassen
+                # EKGdata-Objekt für Upload erzeugen (Sampling-Rate wird aus dem DataFrame bestimmt)
+                # Kompakt: der float64/int64-Upload wird durch float32 (+ int32-Zeit bzw. Start/Intervall) ersetzt
+                ekg = EKGdata.from_dataframe(df_uploaded, max_puls=220, compact=True)  # Default Max-Puls, kann man anpassen
 
                 # Peaks finden, HR berechnen
-                ekg.find_peaks()
+                ekg.find_peaks(method=peak_method)
                 est_hr = ekg.estimate_hr()
                 instant_hr = ekg.get_instant_hr()
 
@@ -84,25 +102,26 @@ with tab2:
                 fig = ekg.plot_with_peaks()
                 st.plotly_chart(fig, use_container_width=True)
 
-                # NeuroKit2 HRV Analyse
-                import neurokit2 as nk
-                try:
-                    processed, info = nk.ecg_process(
-                        ekg.df["Messwerte in mV"].values,
-                        sampling_rate=ekg.sampling_rate
-                    )
-                    rpeaks = info["ECG_R_Peaks"]
-                    hrv_time = nk.hrv_time(rpeaks, sampling_rate=ekg.sampling_rate, show=False)
-                    hrv_freq = nk.hrv_frequency(rpeaks, sampling_rate=ekg.sampling_rate, show=False)
+                # HRV direkt aus den RR-Intervallen
+                st.subheader("HRV - Zeit- und Frequenzbereich")
+                st.write(pd.DataFrame([ekg.hrv_metrics()]))
 
-                    st.subheader("HRV - Zeitbereich")
-                    st.write(hrv_time)
+                # NeuroKit2 nur als optionaler Vergleich (Cache-Schlüssel: Hash des hochgeladenen Inhalts)
+                if st.checkbox("Mit NeuroKit2 vergleichen", key="upload_neurokit"):
+                    try:
+                        upload_key = "upload:" + hashlib.sha1(uploaded_file.getvalue()).hexdigest()
+                        processed, info, hrv_time, hrv_freq = run_neurokit_analysis(
+                            upload_key, ekg.sampling_rate, ekg.signal_values
+                        )
 
-                    st.subheader("HRV - Frequenzbereich")
-                    st.write(hrv_freq)
+                        st.subheader("NeuroKit2 HRV - Zeitbereich")
+                        st.write(hrv_time)
 
-                except Exception as e:
-                    st.warning(f"NeuroKit2 Analyse konnte nicht durchgeführt werden: {e}")
+                        st.subheader("NeuroKit2 HRV - Frequenzbereich")
+                        st.write(hrv_freq)
+
+                    except Exception as e:
+                        st.warning(f"NeuroKit2 Analyse konnte nicht durchgeführt werden: {e}")
 
         except Exception as e:
             st.error(f"Fehler beim Einlesen der Datei: {e}")
@@ -123,7 +142,7 @@ with tab2:
             ekg = ekg_tests[selected_index]
 
             max_hr = person_obj.calc_max_heart_rate(gender=person_obj.gender)
-            ekg.find_peaks(max_puls=max_hr)
+            ekg.find_peaks(max_puls=max_hr, method=peak_method)
             estimated_hr = ekg.estimate_hr()
             instant_hr = ekg.get_instant_hr()
 
@@ -142,10 +161,10 @@ with tab2:
             st.write(f"Herzfrequenz-Variabilität (SDNN): {hr_variability_ms} ms")
 
             # Interpretation mit Werten
-            def interpret_hrv_with_values(hrv_time_dict, hrv_freq_dict):
+            def interpret_hrv_with_values(hrv_dict):
                 interpretations = []
 
-                sdnn = hrv_time_dict.get('HRV_SDNN', 0)
+                sdnn = hrv_dict.get('HRV_SDNN', 0)
                 if sdnn > 50:
                     interpretations.append(f"✅ SDNN ({sdnn:.1f} ms) ist hoch – gute Gesamt-HRV, gesundes autonomes Nervensystem.")
                 elif 30 <= sdnn <= 50:
@@ -153,7 +172,7 @@ with tab2:
                 else:
                     interpretations.append(f"❌ SDNN ({sdnn:.1f} ms) ist niedrig – mögliche Belastung, Stress oder Überlastung.")
 
-                rmssd = hrv_time_dict.get('HRV_RMSSD', 0)
+                rmssd = hrv_dict.get('HRV_RMSSD', 0)
                 if rmssd > 40:
                     interpretations.append(f"✅ RMSSD ({rmssd:.1f} ms) ist hoch – gute parasympathische Aktivität, gute Erholung.")
                 elif 20 <= rmssd <= 40:
@@ -161,7 +180,7 @@ with tab2:
                 else:
                     interpretations.append(f"❌ RMSSD ({rmssd:.1f} ms) ist niedrig – geringe Erholung, möglicher Stress.")
 
-                pnn50 = hrv_time_dict.get('HRV_pNN50', 0)
+                pnn50 = hrv_dict.get('HRV_pNN50', 0)
                 if pnn50 > 10:
                     interpretations.append(f"✅ pNN50 ({pnn50:.1f}%) ist hoch – gutes Erholungsniveau.")
                 elif 5 <= pnn50 <= 10:
@@ -169,7 +188,7 @@ with tab2:
                 else:
                     interpretations.append(f"❌ pNN50 ({pnn50:.1f}%) ist niedrig – geringes Erholungsniveau.")
 
-                lf_hf = hrv_freq_dict.get('HRV_LFHF', 0)
+                lf_hf = hrv_dict.get('HRV_LFHF', 0)
                 if lf_hf < 2:
                     interpretations.append(f"✅ LF/HF-Verhältnis ({lf_hf:.2f}) ist ausgewogen – sympathische und parasympathische Aktivität im Gleichgewicht.")
                 elif 2 <= lf_hf <= 5:
@@ -179,29 +198,36 @@ with tab2:
 
                 return interpretations
 
-            # NeuroKit2 Analyse
-            import neurokit2 as nk
-            try:
-                processed, info = nk.ecg_process(ekg.df["Messwerte in mV"].values, sampling_rate=ekg.sampling_rate)
-                rpeaks = info["ECG_R_Peaks"]
-                hrv_time = nk.hrv_time(rpeaks, sampling_rate=ekg.sampling_rate, show=False)
-                hrv_freq = nk.hrv_frequency(rpeaks, sampling_rate=ekg.sampling_rate, show=False)
+            # HRV-Werte direkt aus den RR-Intervallen (pro Peak-Satz zwischengespeichert)
+            hrv = ekg.hrv_metrics()
+            st.subheader("📝 Interpretation der HRV-Werte")
+            for text in interpret_hrv_with_values(hrv):
+                st.write(text)
 
-                interpretations = interpret_hrv_with_values(hrv_time.iloc[0].to_dict(), hrv_freq.iloc[0].to_dict())
-                st.subheader("📝 Interpretation der HRV-Werte")
-                for text in interpretations:
-                    st.write(text)
+            # NeuroKit2 nur als optionaler Vergleich (zwischengespeichert pro Aufnahme)
+            if st.checkbox("Mit NeuroKit2 vergleichen", key="stored_neurokit"):
+                try:
+                    processed, info, hrv_time, hrv_freq = run_neurokit_analysis(
+                        ekg.data_path, ekg.sampling_rate, ekg.signal_values
+                    )
 
-                # Plot
-                fig_nk = nk.ecg_plot(processed)
-                st.plotly_chart(fig_nk, use_container_width=True)
+                    nk_values = {**hrv_time.iloc[0].to_dict(), **hrv_freq.iloc[0].to_dict()}
+                    keys = ['HRV_SDNN', 'HRV_RMSSD', 'HRV_pNN50', 'HRV_LFHF']
+                    st.write(pd.DataFrame({
+                        "Eigene Berechnung": [hrv[k] for k in keys],
+                        "NeuroKit2": [nk_values.get(k) for k in keys],
+                    }, index=keys))
 
-            except Exception as e:
-                st.warning(f"NeuroKit2 Analyse konnte nicht durchgeführt werden: {e}")
+                    # Plot
+                    fig_nk = nk.ecg_plot(processed)
+                    st.plotly_chart(fig_nk, use_container_width=True)
 
-            # Plot EKG + Herzfrequenz
-            df = ekg.df
-            zeit_min = df["Zeit in ms"] / 60000
+                except Exception as e:
+                    st.warning(f"NeuroKit2 Analyse konnte nicht durchgeführt werden: {e}")
+
+            # Plot EKG + Herzfrequenz (direkt auf den kompakten Arrays, nur die gezeigten Punkte werden umgerechnet)
+            zeit_ms = ekg.times_ms()
+            start_min = zeit_ms[0] / 60000
 
             plot_option = st.radio(
                 "Was soll angezeigt werden?",
@@ -212,24 +238,27 @@ with tab2:
             fig = go.Figure()
 
             if plot_option in ["EKG + Herzfrequenz", "Nur EKG"]:
+                # Nur eine begrenzte Anzahl Punkte an den Browser schicken (Min/Max je Bucket)
+                plot_idx = downsample_indices(zeit_ms, ekg.signal_values,
+                                              x_range=(zeit_ms[0], zeit_ms[0] + 0.2 * 60000))
                 fig.add_trace(go.Scatter(
-                    x=zeit_min,
-                    y=df["Messwerte in mV"],
+                    x=zeit_ms[plot_idx] / 60000,
+                    y=ekg.signal_values[plot_idx],
                     mode='lines',
                     name='EKG Signal'
                 ))
 
-                peaks_df = df[df["Peak"] == 1]
+                peak_times_ms, peak_values = ekg.get_peak_points()
                 fig.add_trace(go.Scatter(
-                    x=peaks_df["Zeit in ms"] / 60000,
-                    y=peaks_df["Messwerte in mV"],
+                    x=peak_times_ms / 60000,
+                    y=peak_values,
                     mode='markers',
                     name='Peaks'
                 ))
 
             if plot_option in ["EKG + Herzfrequenz", "Nur Herzfrequenz"]:
                 if len(instant_hr) > 0:
-                    peak_times_ms = df.loc[df["Peak"] == 1, "Zeit in ms"].values
+                    peak_times_ms = ekg.rr_analysis()["peak_times_ms"]
                     hr_times_min = (peak_times_ms[:-1] + np.diff(peak_times_ms) / 2) / 60000
                     fig.add_trace(go.Scatter(
                         x=hr_times_min,
@@ -244,7 +273,7 @@ with tab2:
                 xaxis_title="Zeit in Minuten",
                 height=500,
                 xaxis=dict(
-                    range=[zeit_min.min(), zeit_min.min() + 0.2],
+                    range=[start_min, start_min + 0.2],
                     rangeslider=dict(visible=True)
                 )
             )
@@ -264,6 +293,30 @@ with tab2:
             fig.update_layout(layout)
             st.plotly_chart(fig, use_container_width=True)
 
+            # HRV-Verlauf über gleitende Fenster
+            st.subheader("📈 HRV-Verlauf")
+            window_s = st.slider("Fensterlänge (s)", min_value=30, max_value=300, value=60, step=10)
+            hrv_timeline = ekg.rolling_hrv(window_s=window_s, step_s=5)
+            if hrv_timeline["hr_bpm"].notna().any():
+                window_mid_min = (hrv_timeline["start_s"] + hrv_timeline["end_s"]) / 2 / 60
+                fig_hrv = go.Figure()
+                fig_hrv.add_trace(go.Scatter(x=window_mid_min, y=hrv_timeline["sdnn_ms"], mode='lines', name='SDNN (ms)'))
+                fig_hrv.add_trace(go.Scatter(x=window_mid_min, y=hrv_timeline["rmssd_ms"], mode='lines', name='RMSSD (ms)'))
+                fig_hrv.add_trace(go.Scatter(x=window_mid_min, y=hrv_timeline["hr_bpm"], mode='lines',
+                                             name='Herzfrequenz (bpm)', yaxis='y2'))
+                fig_hrv.update_layout(
+                    title=f"HRV im gleitenden {window_s}-s-Fenster",
+                    xaxis_title="Zeit in Minuten (Fenstermitte)",
+                    yaxis=dict(title="SDNN / RMSSD (ms)"),
+                    yaxis2=dict(title="Herzfrequenz (bpm)", overlaying="y", side="right"),
+                    height=400
+                )
+                st.plotly_chart(fig_hrv, use_container_width=True)
+                st.download_button("HRV-Verlauf als CSV herunterladen", hrv_timeline.to_csv(index=False),
+                                   file_name=f"hrv_verlauf_ekg_{ekg.id}.csv", mime="text/csv")
+            else:
+                st.info("Aufnahme zu kurz für einen HRV-Verlauf.")
+
         else:
             st.warning("Keine Person ausgewählt oder keine EKG-Daten vorhanden.")
 
@@ -280,10 +333,11 @@ with tab3:
         try:
             df = read_pandas.read_my_csv()
 
+            # Zonen einmal zuordnen, Plot und Zonen-Kennzahlen nutzen dieselben Codes
             zones = read_pandas.get_zone_limit(max_hr_input)
-            df['Zone'] = df['HeartRate'].apply(lambda x: read_pandas.assign_zone(x, zones))
+            zone_codes = read_pandas.zone_codes(df['HeartRate'], zones)
 
-            fig = read_pandas.make_plot(df, zones)
+            fig = read_pandas.make_plot(df, zones, zone_codes)
             st.plotly_chart(fig, use_container_width=True)
 
             # Leistungsanalyse mit Einzelparametern
@@ -303,15 +357,15 @@ with tab3:
             else:
                 st.write("VO2max konnte nicht geschätzt werden.")
 
-            zone_counts = df['Zone'].value_counts().sort_index()
-            zone_minutes = zone_counts / 60
+            # Zonen-Kennzahlen in einem Durchlauf
+            zone_stats = read_pandas.zone_statistics(df, zones, codes=zone_codes)
+            zone_stats = zone_stats[zone_stats['samples'] > 0]
             st.subheader("🕒 Zeit in Herzfrequenzzonen (Minuten)")
-            for zone, minutes in zone_minutes.items():
+            for zone, minutes in zone_stats['duration_min'].items():
                 st.write(f"{zone}: {minutes:.1f} min")
 
-            avg_power_per_zone = df.groupby('Zone')['PowerOriginal'].mean()
             st.subheader("⚡ Durchschnittliche Leistung je Zone")
-            for zone, avg_power in avg_power_per_zone.items():
+            for zone, avg_power in zone_stats['avg_power'].items():
                 st.write(f"{zone}: {avg_power:.1f} Watt")
 
         except FileNotFoundError:
@@ -328,7 +382,7 @@ with tab4:
         ('fitfile_submitted', False),
         ('last_file', None),
         ('cached_df', None),
-        ('cached_filename', None)
+        ('cached_key', None)
     ]:
         if key not in st.session_state:
             st.session_state[key] = default
@@ -343,22 +397,24 @@ with tab4:
             'fitfile_submitted': False,
             'last_file': uploaded_fit_file,
             'cached_df': None,
-            'cached_filename': None
+            'cached_key': None
         })
 
     if st.button("Abschicken"):
         st.session_state['fitfile_submitted'] = True
 
     if uploaded_fit_file is not None and st.session_state['fitfile_submitted']:
-        # Caching für bessere Performance
-        current_filename = uploaded_fit_file.name
+        # Caching für bessere Performance: Schlüssel ist der Dateiinhalt, nicht der Name;
+        # zusätzlich persistenter Cache auf der Platte (geteilt über Sessions)
+        fit_bytes = uploaded_fit_file.getvalue()
+        current_key = read_fit_file.fit_cache_key(fit_bytes)
         if (st.session_state['cached_df'] is None or 
-            st.session_state['cached_filename'] != current_filename):
+            st.session_state['cached_key'] != current_key):
             
             with st.spinner("FIT-Datei wird verarbeitet..."):
-                df = read_fit_file.read_fit_file(uploaded_fit_file)
+                df = read_fit_file.read_fit_file_cached(fit_bytes)
                 st.session_state['cached_df'] = df
-                st.session_state['cached_filename'] = current_filename
+                st.session_state['cached_key'] = current_key
         else:
             df = st.session_state['cached_df']
 
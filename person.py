@@ -1,10 +1,10 @@
-import json
+import read_data
 from ekgdata import EKGdata
 from datetime import datetime
 
 class Person:
 
-    def __init__(self, person_dict):
+    def __init__(self, person_dict, compact_ekg=False):
         self.id = person_dict["id"]
         self.firstname = person_dict["firstname"]
         self.lastname = person_dict["lastname"]
@@ -12,7 +12,8 @@ class Person:
         self.picture_path = person_dict["picture_path"]
         self.gender = person_dict["gender"]
         self.ekg_tests_raw = person_dict.get("ekg_tests", [])
-        self.ekg_tests = [EKGdata(test) for test in self.ekg_tests_raw]  # Liste von EKGdata-Objekten
+        # Liste von EKGdata-Objekten (Signal wird erst bei Bedarf geladen, mit compact_ekg als float32-Array)
+        self.ekg_tests = [EKGdata(test, compact=compact_ekg) for test in self.ekg_tests_raw]
 
     def calc_age(self):
         current_year = datetime.now().year
@@ -30,9 +31,8 @@ class Person:
 
     @staticmethod
     def load_person_data():
-        """Lädt alle Personen als Dictionary-Liste"""
-        with open("data/person_db.json") as file:
-            return json.load(file)
+        """Lädt alle Personen als Dictionary-Liste (zwischengespeichert im Repository)"""
+        return read_data.load_person_data()
 
     @staticmethod
     def get_person_list(person_data):
@@ -41,25 +41,15 @@ class Person:
 
     @staticmethod
     def find_person_data_by_name(suchstring):
-        """Findet Personendatensatz per 'Nachname, Vorname'-String"""
-        if suchstring == "None":
-            return {}
-        person_data = Person.load_person_data()
-        try:
-            lastname, firstname = suchstring.split(", ")
-        except ValueError:
-            return {}
-        for p in person_data:
-            if p["lastname"] == lastname and p["firstname"] == firstname:
-                return p
-        return {}
+        """Findet Personendatensatz per 'Nachname, Vorname'-String (Index-Lookup)"""
+        return read_data.find_person_data_by_name(suchstring)
 
     @classmethod
-    def load_by_name(cls, name_str):
+    def load_by_name(cls, name_str, compact_ekg=False):
         """Instanziiert eine Person anhand des Namens"""
         person_dict = cls.find_person_data_by_name(name_str)
         if person_dict:
-            return cls(person_dict)
+            return cls(person_dict, compact_ekg=compact_ekg)
         return None
 
 
@@ -0,0 +1,167 @@
+import json
+import sqlite3
+import sys
+from contextlib import closing
+from datetime import date, datetime
+
+PERSON_FIELDS = ["id", "firstname", "lastname", "date_of_birth", "picture_path", "gender"]
+EKG_FIELDS = ["id", "date", "result_link"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS persons (
+    id INTEGER PRIMARY KEY,
+    firstname TEXT NOT NULL,
+    lastname TEXT NOT NULL,
+    date_of_birth INTEGER,
+    picture_path TEXT,
+    gender TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_persons_name ON persons (lastname, firstname);
+
+CREATE TABLE IF NOT EXISTS ekg_tests (
+    id INTEGER PRIMARY KEY,
+    person_id INTEGER NOT NULL REFERENCES persons (id) ON DELETE CASCADE,
+    date TEXT,
+    date_iso TEXT,
+    result_link TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_ekg_tests_person ON ekg_tests (person_id);
+CREATE INDEX IF NOT EXISTS idx_ekg_tests_date ON ekg_tests (date_iso);
+"""
+
+
+def to_iso_date(value):
+    """Wandelt 'TT.MM.JJJJ' (Format der JSON-Datenbank), date-Objekte oder ISO-Strings in 'JJJJ-MM-TT' um.
+
+    Fehlende oder unbekannte Formate ergeben None (date_iso bleibt NULL, der Import läuft weiter).
+    """
+    if isinstance(value, date):
+        return value.isoformat()
+    try:
+        return datetime.strptime(value, "%d.%m.%Y").date().isoformat()
+    except (TypeError, ValueError):
+        pass
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def _split_extra(record, fields):
+    """Trennt bekannte Spalten von zusätzlichen Schlüsseln (werden als JSON gespeichert)"""
+    extra = {k: v for k, v in record.items() if k not in fields and k != "ekg_tests"}
+    return [record.get(field) for field in fields], json.dumps(extra) if extra else None
+
+
+def _row_to_dict(row, fields):
+    record = {field: row[field] for field in fields}
+    if row["extra"]:
+        record.update(json.loads(row["extra"]))
+    return record
+
+
+class SQLitePersonRepository:
+    """SQLite-Ablage für Personen und EKG-Metadaten mit derselben Schnittstelle wie PersonRepository.
+
+    Jede Abfrage liest nur die benötigten Zeilen über Indizes (Name, Personen-ID, Datum),
+    statt die komplette Datenbank einzulesen.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as connection, connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA foreign_keys = ON")
+        return connection
+
+    def import_json(self, json_path, replace=True):
+        """Importiert eine Personen-Datenbank im JSON-Format (z.B. data/person_db.json)"""
+        with open(json_path) as file:
+            person_data = json.load(file)
+
+        with closing(self._connect()) as connection, connection:
+            if replace:
+                connection.execute("DELETE FROM ekg_tests")
+                connection.execute("DELETE FROM persons")
+            for person in person_data:
+                values, extra = _split_extra(person, PERSON_FIELDS)
+                connection.execute(
+                    "INSERT OR REPLACE INTO persons (id, firstname, lastname, date_of_birth, picture_path, gender, extra)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", values + [extra])
+                for test in person.get("ekg_tests", []):
+                    test_values, test_extra = _split_extra(test, EKG_FIELDS)
+                    connection.execute(
+                        "INSERT OR REPLACE INTO ekg_tests (id, person_id, date, date_iso, result_link, extra)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        [test_values[0], person["id"], test_values[1], to_iso_date(test_values[1]),
+                         test_values[2], test_extra])
+        return len(person_data)
+
+    def _person_with_tests(self, connection, row):
+        person = _row_to_dict(row, PERSON_FIELDS)
+        person["ekg_tests"] = self._tests(connection, "WHERE person_id = ?", [row["id"]])
+        return person
+
+    @staticmethod
+    def _tests(connection, where, params):
+        rows = connection.execute(f"SELECT * FROM ekg_tests {where} ORDER BY date_iso, id", params)
+        return [_row_to_dict(row, EKG_FIELDS) for row in rows]
+
+    def all(self):
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT * FROM persons ORDER BY id").fetchall()
+            return [self._person_with_tests(connection, row) for row in rows]
+
+    def names(self):
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT lastname, firstname FROM persons ORDER BY id")
+            return [f"{row['lastname']}, {row['firstname']}" for row in rows]
+
+    def get_by_id(self, person_id):
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT * FROM persons WHERE id = ?", [person_id]).fetchone()
+            return self._person_with_tests(connection, row) if row else {}
+
+    def get_by_name(self, suchstring):
+        if suchstring == "None":
+            return {}
+        try:
+            nachname, vorname = [s.strip() for s in suchstring.split(", ")]
+        except (ValueError, AttributeError):
+            return {}
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT * FROM persons WHERE lastname = ? AND firstname = ?"
+                                     " ORDER BY id LIMIT 1", [nachname, vorname]).fetchone()
+            return self._person_with_tests(connection, row) if row else {}
+
+    def tests_for_person(self, person_id):
+        """Alle EKG-Tests einer Person (nach Datum sortiert)"""
+        with closing(self._connect()) as connection:
+            return self._tests(connection, "WHERE person_id = ?", [person_id])
+
+    def tests_in_date_range(self, start, end):
+        """Alle EKG-Tests mit start <= Datum <= end, jeweils mit person_id (Tests ohne Datum fehlen)"""
+        start_iso, end_iso = to_iso_date(start), to_iso_date(end)
+        if start_iso is None or end_iso is None:
+            raise ValueError(f"Ungültiger Datumsbereich: {start!r} bis {end!r}")
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT * FROM ekg_tests WHERE date_iso BETWEEN ? AND ? ORDER BY date_iso, id",
+                [start_iso, end_iso])
+            return [dict(_row_to_dict(row, EKG_FIELDS), person_id=row["person_id"]) for row in rows]
+
+
+if __name__ == "__main__":
+    # Aufruf: python person_sqlite.py [quelle.json] [ziel.sqlite]
+    json_path = sys.argv[1] if len(sys.argv) > 1 else "data/person_db.json"
+    sqlite_path = sys.argv[2] if len(sys.argv) > 2 else "data/person_db.sqlite"
+    repository = SQLitePersonRepository(sqlite_path)
+    count = repository.import_json(json_path)
+    print(f"{count} Personen aus {json_path} nach {sqlite_path} importiert")
+    print("Alle Personen:", repository.names())
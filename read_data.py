@@ -1,46 +1,101 @@
 import json
+import os
 
-def load_person_data():
-    """A Function that knows where the person database is and returns a dictionary with the persons"""
-    # Opening JSON file
-    file = open("data/person_db.json")
+PERSON_DB_PATH = "data/person_db.json"
 
-    # Loading the JSON File in a dictionary
-    person_data = json.load(file)
 
-    return person_data
+class PersonRepository:
+    """Hält die Personen-Datenbank im Speicher und liest sie nur neu ein, wenn sich die Datei ändert.
 
-def get_person_list():
+    Zusätzlich werden Indizes nach ID und nach 'Nachname, Vorname' gepflegt,
+    damit Suchen nicht mehr linear über alle Einträge laufen.
     """
-    Gibt eine Liste mit Strings der Form 'Nachname, Vorname' für jede Person zurück.
+
+    def __init__(self, path=PERSON_DB_PATH):
+        self.path = path
+        self._mtime_ns = None
+        self._persons = []
+        self._by_id = {}
+        self._by_name = {}
+
+    @staticmethod
+    def make_name(lastname, firstname):
+        return f"{lastname.strip()}, {firstname.strip()}"
+
+    def _refresh(self):
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        if mtime_ns == self._mtime_ns:
+            return
+        with open(self.path) as file:
+            persons = json.load(file)
+        self._persons = persons
+        self._by_id = {p["id"]: p for p in persons}
+        self._by_name = {}
+        for p in persons:  # bei gleichem Namen gilt wie bei der linearen Suche der erste Eintrag
+            self._by_name.setdefault(self.make_name(p["lastname"], p["firstname"]), p)
+        self._mtime_ns = mtime_ns
+
+    def all(self):
+        self._refresh()
+        return self._persons
+
+    def names(self):
+        """'Nachname, Vorname' für jede Person, doppelte Namen bleiben erhalten"""
+        self._refresh()
+        return [f"{p['lastname']}, {p['firstname']}" for p in self._persons]
+
+    def get_by_id(self, person_id):
+        self._refresh()
+        return self._by_id.get(person_id, {})
+
+    def get_by_name(self, suchstring):
+        if suchstring == "None":
+            return {}
+        try:
+            nachname, vorname = suchstring.split(", ")
+        except (ValueError, AttributeError):
+            return {}
+        self._refresh()
+        return self._by_name.get(self.make_name(nachname, vorname), {})
+
+
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+
+def open_repository(path=None):
+    """Öffnet die Personen-Datenbank; der Pfad kann per Umgebungsvariable PERSON_DB gesetzt werden.
+
+    Dateien mit Endung .sqlite/.sqlite3/.db werden über das SQLite-Backend gelesen
+    (Import siehe person_sqlite.py), alles andere als JSON.
     """
-    data = load_person_data()
-    person_list = []
+    path = path or os.environ.get("PERSON_DB", PERSON_DB_PATH)
+    if path.lower().endswith(SQLITE_SUFFIXES):
+        from person_sqlite import SQLitePersonRepository
+        return SQLitePersonRepository(path)
+    return PersonRepository(path)
 
-    for eintrag in data:
-        vorname = eintrag["firstname"]
-        nachname = eintrag["lastname"]
-        person_list.append(f"{nachname}, {vorname}")
-    
-    return person_list
 
-def find_person_data_by_name(suchstring):
-    """Findet die Person in der Datenbank basierend auf 'Nachname, Vorname'."""
-    person_data = load_person_data()
+_repository = open_repository()
 
-    if suchstring == "None":
-        return {}
 
-    try:
-        nachname, vorname = [s.strip() for s in suchstring.split(", ")]
-    except ValueError:
-        return {}
+def get_repository():
+    """Gemeinsam genutzte Repository-Instanz für die Standard-Datenbank"""
+    return _repository
+
+
+def load_person_data():
+    """A Function that knows where the person database is and returns a dictionary with the persons"""
+    return _repository.all()
 
-    for eintrag in person_data:
-        if eintrag["lastname"] == nachname and eintrag["firstname"] == vorname:
-            return eintrag
+def get_person_list():
+    """
+    Gibt eine Liste mit Strings der Form 'Nachname, Vorname' für jede Person zurück.
+    """
+    return _repository.names()
 
-    return {}  # keine Person gefunden
+def find_person_data_by_name(suchstring):
+    """Findet die Person in der Datenbank basierend auf 'Nachname, Vorname'."""
+    return _repository.get_by_name(suchstring)  # {} falls keine Person gefunden
 
 
 if __name__ == "__main__":
@@ -1,14 +1,21 @@
 from fitparse import FitFile
+from fitparse.profile import FIELD_TYPES
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import folium
-import matplotlib.cm as cm
+import matplotlib
 import matplotlib.colors as colors
 from functools import lru_cache
+import hashlib
+import os
+import struct
+import time
 
 # Konstanten für bessere Performance
 SEMICIRCLE_TO_DEGREE = 180 / 2**31
+COLOR_BUCKETS = 32  # Anzahl Farbstufen für die farbkodierte Route
+MAP_WIDTH_PX = 700  # Breite der Karte in main.py (st_folium)
 AVAILABLE_METRICS = {
     'altitude': 'Höhenmeter',
     'heart_rate': 'Herzfrequenz', 
@@ -16,8 +23,112 @@ AVAILABLE_METRICS = {
     'power': 'Leistung'
 }
 
-def read_fit_file(file):
-    """Optimierte FIT-File Einlesung mit besserer Performance"""
+# FIT-Profil der unterstützten 'record'-Felder: Name -> (Feldnummer, Skalierung, Offset)
+RECORD_FIELD_PROFILE = {
+    'timestamp': (253, 1, 0),
+    'position_lat': (0, 1, 0),
+    'position_long': (1, 1, 0),
+    'altitude': (2, 5, 500),
+    'heart_rate': (3, 1, 0),
+    'cadence': (4, 1, 0),
+    'distance': (5, 100, 0),
+    'speed': (6, 1000, 0),
+    'power': (7, 1, 0),
+    'temperature': (13, 1, 0),
+    'enhanced_speed': (73, 1000, 0),
+    'enhanced_altitude': (78, 5, 500),
+}
+# Wie bei fitparse: speed/altitude werden zusätzlich als enhanced_* ausgegeben, falls diese fehlen
+RECORD_COMPONENTS = {6: 'enhanced_speed', 2: 'enhanced_altitude'}
+DEFAULT_RECORD_FIELDS = ['timestamp', 'position_lat', 'position_long', 'heart_rate', 'altitude',
+                         'enhanced_altitude', 'speed', 'enhanced_speed', 'power', 'distance', 'cadence']
+
+# Zusammenfassungen, die Geräte am Ende jeder Runde/Einheit selbst schreiben
+SESSION_FIELD_PROFILE = {
+    'timestamp': (253, 1, 0),
+    'start_time': (2, 1, 0),
+    'sport': (5, 1, 0),
+    'total_elapsed_time': (7, 1000, 0),
+    'total_timer_time': (8, 1000, 0),
+    'total_distance': (9, 100, 0),
+    'total_calories': (11, 1, 0),
+    'avg_speed': (14, 1000, 0),
+    'max_speed': (15, 1000, 0),
+    'avg_heart_rate': (16, 1, 0),
+    'max_heart_rate': (17, 1, 0),
+    'avg_power': (20, 1, 0),
+    'max_power': (21, 1, 0),
+    'total_ascent': (22, 1, 0),
+    'total_descent': (23, 1, 0),
+    'enhanced_avg_speed': (124, 1000, 0),
+    'enhanced_max_speed': (125, 1000, 0),
+}
+SESSION_COMPONENTS = {14: 'enhanced_avg_speed', 15: 'enhanced_max_speed'}
+LAP_FIELD_PROFILE = {
+    'timestamp': (253, 1, 0),
+    'start_time': (2, 1, 0),
+    'sport': (25, 1, 0),
+    'total_elapsed_time': (7, 1000, 0),
+    'total_timer_time': (8, 1000, 0),
+    'total_distance': (9, 100, 0),
+    'total_calories': (11, 1, 0),
+    'avg_speed': (13, 1000, 0),
+    'max_speed': (14, 1000, 0),
+    'avg_heart_rate': (15, 1, 0),
+    'max_heart_rate': (16, 1, 0),
+    'avg_power': (19, 1, 0),
+    'max_power': (20, 1, 0),
+    'total_ascent': (21, 1, 0),
+    'total_descent': (22, 1, 0),
+    'enhanced_avg_speed': (110, 1000, 0),
+    'enhanced_max_speed': (111, 1000, 0),
+}
+LAP_COMPONENTS = {13: 'enhanced_avg_speed', 14: 'enhanced_max_speed'}
+DATETIME_FIELDS = {'timestamp', 'start_time'}
+SPORT_NAMES = FIELD_TYPES['sport'].values  # Enum-Wert -> Name (z.B. 2 -> 'cycling')
+
+FIT_CACHE_DIR = 'data/fit_file/.cache'
+FIT_CACHE_MAX_BYTES = 500 * 1024**2  # älteste Einträge werden oberhalb dieser Größe gelöscht
+
+FIT_EPOCH_OFFSET = 631065600  # Sekunden zwischen 1970-01-01 und 1989-12-31 (FIT-Epoche)
+RECORD_MESSAGE_NUMBER = 20
+SESSION_MESSAGE_NUMBER = 18
+LAP_MESSAGE_NUMBER = 19
+# Basistyp-Nummer -> (struct-Formatzeichen, ungültiger Wert)
+FIT_BASE_TYPES = {
+    0x00: ('B', 0xFF), 0x01: ('b', 0x7F), 0x02: ('B', 0xFF), 0x03: ('h', 0x7FFF),
+    0x04: ('H', 0xFFFF), 0x05: ('i', 0x7FFFFFFF), 0x06: ('I', 0xFFFFFFFF), 0x08: ('f', None),
+    0x09: ('d', None), 0x0A: ('B', 0x00), 0x0B: ('H', 0x0000), 0x0C: ('I', 0x00000000),
+    0x0D: ('B', 0xFF), 0x0E: ('q', 0x7FFFFFFFFFFFFFFF), 0x0F: ('Q', 0xFFFFFFFFFFFFFFFF),
+    0x10: ('Q', 0),
+}
+
+def read_fit_file(file, fields=None):
+    """Optimierte FIT-File Einlesung mit besserer Performance
+
+    fields=None liest alle Felder über fitparse. Mit einer Feldliste (z.B.
+    DEFAULT_RECORD_FIELDS) wird der schnelle Decoder verwendet, der nur diese
+    'record'-Felder direkt aus den Binärdaten in Spalten-Arrays extrahiert.
+    """
+    if fields is not None:
+        df = read_fit_records_fast(file, fields)
+    else:
+        df = _read_fit_file_fitparse(file)
+    return _add_time_seconds(df)
+
+def _add_time_seconds(df):
+    if df.empty:
+        return df
+
+    # Zeit in Sekunden berechnen (falls timestamp vorhanden)
+    if 'timestamp' in df.columns:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        start_time = df['timestamp'].iloc[0]
+        df['time_seconds'] = (df['timestamp'] - start_time).dt.total_seconds()
+    
+    return df
+
+def _read_fit_file_fitparse(file):
     fitfile = FitFile(file)
     all_records = []
     
@@ -29,22 +140,340 @@ def read_fit_file(file):
     if not all_records:
         return pd.DataFrame()
     
-    df = pd.DataFrame(all_records)
-    
-    # Zeit in Sekunden berechnen (falls timestamp vorhanden)
-    if 'timestamp' in df.columns:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        start_time = df['timestamp'].iloc[0]
-        df['time_seconds'] = (df['timestamp'] - start_time).dt.total_seconds()
-    
+    return pd.DataFrame(all_records)
+
+def _read_bytes(file):
+    if isinstance(file, (bytes, bytearray)):
+        return file
+    if hasattr(file, 'read'):
+        return file.read()
+    with open(file, 'rb') as f:
+        return f.read()
+
+def _message_layout(field_defs, little_endian, columns, components):
+    """Extraktionsplan für eine Definition: nur angeforderte Felder"""
+    endian = '<' if little_endian else '>'
+    present = {number for number, _, _ in field_defs}
+    plan, offset = [], 0
+    for number, size, base_type in field_defs:
+        fmt, invalid = FIT_BASE_TYPES.get(base_type & 0x1F, (None, None))
+        if fmt is not None and struct.calcsize(fmt) == size:
+            targets = [columns[number]] if number in columns else []
+            component = components.get(number)
+            if component in columns.values() and not any(columns.get(n) == component for n in present):
+                targets.append(component)
+            if targets:
+                plan.append((offset, endian + fmt, invalid, targets))
+        offset += size
+    return plan
+
+def _decode_fit_messages(data, wanted):
+    """Liest die angeforderten Nachrichtentypen direkt aus den FIT-Binärdaten.
+
+    wanted: {globale Nachrichtennummer: (Feldprofil, Komponenten, Feldnamen)}.
+    Definitionen und Datennachrichten werden per struct gelesen; nur angeforderte
+    Felder landen in vorab angelegten numpy-Arrays (bei Bedarf verdoppelt). Alle
+    anderen Nachrichten werden nur übersprungen. Liefert je Nachrichtentyp einen DataFrame.
+    """
+    header_size = data[0]
+    if data[8:12] != b'.FIT':
+        raise ValueError("Keine gültige FIT-Datei")
+    end = header_size + struct.unpack_from('<I', data, 4)[0]
+
+    state = {}
+    for global_msg, (profile, components, fields) in wanted.items():
+        unknown = set(fields) - set(profile)
+        if unknown:
+            raise ValueError(f"Unbekannte Felder: {sorted(unknown)}")
+        capacity = max(1024, (end - header_size) // 16) if global_msg == RECORD_MESSAGE_NUMBER else 16
+        state[global_msg] = {
+            # Zeitstempel wird separat verfolgt (auch über komprimierte Header)
+            'columns': {profile[name][0]: name for name in fields if name != 'timestamp'},
+            'components': components,
+            'arrays': {name: np.full(capacity, np.nan) for name in fields},
+            'seen': set(),
+            'n': 0,
+        }
+
+    definitions = {}  # lokaler Typ -> (Größe, Timestamp-Position, Zustand, Plan)
+    last_timestamp = None
+    pos = header_size
+    while pos < end:
+        header = data[pos]
+        pos += 1
+
+        if header & 0x80:  # komprimierter Zeitstempel-Header
+            local_type = (header >> 5) & 0x03
+            time_offset = header & 0x1F
+            if last_timestamp is not None:
+                last_timestamp += (time_offset - last_timestamp) & 0x1F
+            compressed = True
+        elif header & 0x40:  # Definitionsnachricht
+            local_type = header & 0x0F
+            little_endian = data[pos + 1] == 0
+            global_msg = struct.unpack_from('<H' if little_endian else '>H', data, pos + 2)[0]
+            num_fields = data[pos + 4]
+            pos += 5
+            field_defs = [tuple(data[pos + 3 * i:pos + 3 * i + 3]) for i in range(num_fields)]
+            pos += 3 * num_fields
+            size = sum(s for _, s, _ in field_defs)
+            if header & 0x20:  # Developer-Felder: nur Größe berücksichtigen
+                num_dev = data[pos]
+                size += sum(data[pos + 1 + 3 * i + 1] for i in range(num_dev))
+                pos += 1 + 3 * num_dev
+
+            ts_pos, offset = None, 0
+            for number, s, _ in field_defs:
+                if number == 253 and s == 4:
+                    ts_pos = (offset, '<I' if little_endian else '>I')
+                offset += s
+            msg_state = state.get(global_msg)
+            plan = None
+            if msg_state is not None:
+                plan = _message_layout(field_defs, little_endian, msg_state['columns'], msg_state['components'])
+                msg_state['seen'].update(target for *_, targets in plan for target in targets)
+            definitions[local_type] = (size, ts_pos, msg_state, plan)
+            continue
+        else:
+            local_type = header & 0x0F
+            compressed = False
+
+        size, ts_pos, msg_state, plan = definitions[local_type]
+        if ts_pos is not None:
+            value = struct.unpack_from(ts_pos[1], data, pos + ts_pos[0])[0]
+            if value != 0xFFFFFFFF:
+                last_timestamp = value
+
+        if msg_state is not None:
+            arrays, n = msg_state['arrays'], msg_state['n']
+            if n == len(next(iter(arrays.values()))):
+                for name in arrays:
+                    grown = np.full(2 * n, np.nan)
+                    grown[:n] = arrays[name]
+                    arrays[name] = grown
+            for offset, fmt, invalid, targets in plan:
+                value = struct.unpack_from(fmt, data, pos + offset)[0]
+                if value != invalid:
+                    for target in targets:
+                        arrays[target][n] = value
+            if 'timestamp' in arrays and (ts_pos is not None or compressed) and last_timestamp is not None:
+                arrays['timestamp'][n] = last_timestamp
+                msg_state['seen'].add('timestamp')
+            msg_state['n'] = n + 1
+        pos += size
+
+    result = {}
+    for global_msg, (profile, _, fields) in wanted.items():
+        msg_state = state[global_msg]
+        n = msg_state['n']
+        df = pd.DataFrame({name: msg_state['arrays'][name][:n] for name in fields if name in msg_state['seen']})
+        for name in df.columns:
+            _, scale, offset = profile[name]
+            if name in DATETIME_FIELDS:
+                df[name] = pd.to_datetime(df[name] + FIT_EPOCH_OFFSET, unit='s')
+            elif scale != 1 or offset != 0:
+                df[name] = df[name] / scale - offset
+        if 'sport' in df:
+            df['sport'] = df['sport'].map(lambda v: SPORT_NAMES.get(int(v), int(v)) if pd.notna(v) else None)
+        result[global_msg] = df
+    return result
+
+def read_fit_records_fast(file, fields=DEFAULT_RECORD_FIELDS):
+    """Schneller Decoder für 'record'-Nachrichten mit Feldauswahl.
+
+    Statt pro Datensatz ein Dictionary aller Felder zu erzeugen, werden nur die
+    angeforderten Felder in Spalten-Arrays geschrieben. Ungültige Werte werden NaN,
+    Skalierung/Offset wie im FIT-Profil (gleiche Einheiten wie fitparse).
+    """
+    wanted = {RECORD_MESSAGE_NUMBER: (RECORD_FIELD_PROFILE, RECORD_COMPONENTS, fields)}
+    return _decode_fit_messages(_read_bytes(file), wanted)[RECORD_MESSAGE_NUMBER]
+
+def _summary_messages():
+    return {
+        SESSION_MESSAGE_NUMBER: (SESSION_FIELD_PROFILE, SESSION_COMPONENTS, list(SESSION_FIELD_PROFILE)),
+        LAP_MESSAGE_NUMBER: (LAP_FIELD_PROFILE, LAP_COMPONENTS, list(LAP_FIELD_PROFILE)),
+    }
+
+def read_fit_summaries(file):
+    """Nur-Zusammenfassung: liest session- und lap-Nachrichten, record-Daten werden übersprungen"""
+    messages = _decode_fit_messages(_read_bytes(file), _summary_messages())
+    return {'session': messages[SESSION_MESSAGE_NUMBER], 'lap': messages[LAP_MESSAGE_NUMBER]}
+
+def read_fit_activity(file, fields=DEFAULT_RECORD_FIELDS):
+    """Records (mit Feldauswahl) und session/lap-Zusammenfassungen in einem Durchlauf"""
+    wanted = _summary_messages()
+    wanted[RECORD_MESSAGE_NUMBER] = (RECORD_FIELD_PROFILE, RECORD_COMPONENTS, fields)
+    messages = _decode_fit_messages(_read_bytes(file), wanted)
+    summaries = {'session': messages[SESSION_MESSAGE_NUMBER], 'lap': messages[LAP_MESSAGE_NUMBER]}
+    return _add_time_seconds(messages[RECORD_MESSAGE_NUMBER]), summaries
+
+def summarize_sessions(sessions):
+    """Kennzahlen wie summarize_records, aber aus den session-Nachrichten (ohne Record-Scan).
+
+    Funktioniert ebenso für lap-Nachrichten (gleiche Feldnamen). Liefert None, wenn keine
+    verwertbare Nachricht vorhanden ist; einzelne fehlende Felder sind NaN bzw. None.
+    """
+    if sessions.empty or 'total_elapsed_time' not in sessions:
+        return None
+
+    def total(column, reducer='sum'):
+        if column not in sessions or sessions[column].isna().all():
+            return np.nan
+        return getattr(sessions[column], reducer)()
+
+    def weighted_mean(column):
+        if column not in sessions or sessions[column].isna().all():
+            return np.nan
+        valid = sessions[column].notna()
+        weights = sessions.loc[valid, 'total_elapsed_time']
+        return np.average(sessions.loc[valid, column], weights=weights) if weights.sum() > 0 else np.nan
+
+    return {
+        'start_time': sessions['start_time'].min() if 'start_time' in sessions else None,
+        'sport': ', '.join(str(s) for s in sessions['sport'].dropna().unique()) or None if 'sport' in sessions else None,
+        'duration_hours': total('total_elapsed_time') / 3600,
+        'distance_km': total('total_distance') / 1000,
+        'avg_hr': weighted_mean('avg_heart_rate'),
+        'max_hr': total('max_heart_rate', 'max'),
+        'elevation_gain_m': total('total_ascent'),
+        'avg_power': weighted_mean('avg_power'),
+    }
+
+def merge_summaries(*summaries):
+    """Kennzahlen feldweise zusammenführen: je Feld gilt die erste Quelle mit gültigem Wert.
+
+    Geräte schreiben oft nur einen Teil der session-Felder (z.B. ohne Herzfrequenz); so
+    werden die Lücken z.B. aus den laps oder den Records gefüllt. None-Quellen werden übersprungen.
+    """
+    merged = {}
+    for summary in summaries:
+        for key, value in (summary or {}).items():
+            if key not in merged or _is_missing(merged[key]):
+                merged[key] = value
+    return merged
+
+# record-Felder, aus denen summarize_records die jeweilige Kennzahl berechnet
+SUMMARY_RECORD_FIELDS = {
+    'distance_km': ['distance'],
+    'avg_hr': ['heart_rate'],
+    'max_hr': ['heart_rate'],
+    'elevation_gain_m': ['altitude', 'enhanced_altitude'],
+    'avg_power': ['power'],
+}
+
+def record_fields_for(keys):
+    """Minimale record-Feldauswahl, um die Kennzahlen keys aus den Records zu berechnen"""
+    fields = ['timestamp']  # Startzeit und Dauer
+    for key in keys:
+        fields += [f for f in SUMMARY_RECORD_FIELDS.get(key, []) if f not in fields]
+    return fields
+
+def missing_fields(summary):
+    """Schlüssel einer Kennzahlen-Zeile ohne gültigen Wert (None/NaN/NaT)"""
+    return [key for key, value in summary.items() if _is_missing(value)]
+
+def _is_missing(value):
+    return value is None or (np.isscalar(value) and pd.isna(value))
+
+def fit_cache_key(data, fields=DEFAULT_RECORD_FIELDS):
+    """Cache-Schlüssel aus Dateiinhalt (SHA-256) und Feldauswahl"""
+    field_part = 'all' if fields is None else hashlib.sha1(','.join(fields).encode()).hexdigest()[:12]
+    return f"{hashlib.sha256(data).hexdigest()}-{field_part}"
+
+def _evict_fit_cache(cache_dir, max_bytes):
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.parquet'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):  # zuletzt benutzte Einträge zuletzt löschen
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def read_fit_file_cached(file, fields=DEFAULT_RECORD_FIELDS, cache_dir=FIT_CACHE_DIR,
+                         max_bytes=FIT_CACHE_MAX_BYTES):
+    """read_fit_file mit persistentem Parquet-Cache, geteilt über Sessions und Nutzer.
+
+    Der Schlüssel ist ein Hash des Dateiinhalts, gleichnamige aber verschiedene Dateien
+    kollidieren also nicht. Treffer werden als zuletzt benutzt markiert; übersteigt der
+    Cache max_bytes, werden die am längsten nicht benutzten Einträge gelöscht.
+    """
+    data = _read_bytes(file)
+    path = os.path.join(cache_dir, fit_cache_key(data, fields) + '.parquet')
+
+    if os.path.exists(path):
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path)
+            return df
+        except Exception:
+            pass  # beschädigter Eintrag -> neu einlesen
+
+    df = read_fit_file(data, fields=fields)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        _evict_fit_cache(cache_dir, max_bytes)
+    except Exception:
+        pass  # Cache ist optional (z.B. ohne pyarrow oder ohne Schreibrechte)
     return df
 
+def benchmark_read_fit_file(paths, fields=DEFAULT_RECORD_FIELDS, repeat=1):
+    """Vergleicht fitparse-Einlesung (alle Felder) mit dem schnellen Decoder (Feldauswahl)"""
+    rows = []
+    for path in paths:
+        timings = {}
+        for mode, mode_fields in (('fitparse', None), ('fast', fields)):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                df = read_fit_file(path, fields=mode_fields)
+            timings[mode] = (time.perf_counter() - start) / repeat
+        rows.append({
+            'file': path,
+            'records': len(df),
+            'fitparse_s': timings['fitparse'],
+            'fast_s': timings['fast'],
+            'speedup': timings['fitparse'] / timings['fast'] if timings['fast'] > 0 else np.nan,
+        })
+    return pd.DataFrame(rows)
+
 def calculate_workout_duration_hours(df):
     """Effiziente Berechnung der Workout-Dauer"""
     if 'time_seconds' not in df or df.empty:
         return 0
     return (df['time_seconds'].iloc[-1] - df['time_seconds'].iloc[0]) / 3600
 
+def _column_or_none(df, *names):
+    for name in names:
+        if name in df and not df[name].isna().all():
+            return df[name]
+    return None
+
+def summarize_records(df):
+    """Kennzahlen einer Aktivität aus den record-Daten (wie im FIT-Tab angezeigt)"""
+    distance = _column_or_none(df, 'distance')
+    heart_rate = _column_or_none(df, 'heart_rate')
+    altitude = _column_or_none(df, 'altitude', 'enhanced_altitude')
+    power = _column_or_none(df, 'power')
+    return {
+        'start_time': df['timestamp'].iloc[0] if 'timestamp' in df and not df.empty else None,
+        'n_records': len(df),
+        'duration_hours': calculate_workout_duration_hours(df),
+        'distance_km': distance.max() / 1000 if distance is not None else np.nan,
+        'avg_hr': heart_rate.mean() if heart_rate is not None else np.nan,
+        'max_hr': heart_rate.max() if heart_rate is not None else np.nan,
+        'elevation_gain_m': altitude.diff().clip(lower=0).sum() if altitude is not None else np.nan,
+        'avg_power': power.mean() if power is not None else np.nan,
+    }
+
 def create_time_plot(df, column, title, y_label, duration_hours):
     """Generische Funktion für Zeit-basierte Plots"""
     if column not in df or df[column].isna().all():
@@ -85,7 +514,7 @@ def plot_altitude(df, duration_hours):
 @lru_cache(maxsize=1)
 def get_colormap():
     """Cached Colormap für bessere Performance"""
-    return cm.get_cmap('viridis')
+    return matplotlib.colormaps['viridis']  # cm.get_cmap gibt es ab matplotlib 3.9 nicht mehr
 
 def get_lat_lon_optimized(df):
     """Optimierte GPS-Koordinaten Extraktion"""
@@ -111,6 +540,59 @@ def get_lat_lon_optimized(df):
     
     return lat[mask], lon[mask], mask
 
+def _project(latitudes, longitudes):
+    """Näherungsweise flache Projektion (Längengrade mit cos(Breite) skaliert)"""
+    scale = np.cos(np.radians(np.mean(latitudes)))
+    return np.asarray(longitudes) * scale, np.asarray(latitudes)
+
+def route_tolerance(latitudes, longitudes, map_width_px=MAP_WIDTH_PX, pixel_fraction=0.5):
+    """Vereinfachungs-Toleranz passend zur Zoomstufe der Karte.
+
+    Die Karte wird per fit_bounds auf die ganze Route eingepasst (Zoom ist deaktiviert),
+    ein Pixel entspricht also etwa Ausdehnung / Kartenbreite. Abweichungen unter einem
+    halben Pixel sind nicht sichtbar.
+    """
+    x, y = _project(latitudes, longitudes)
+    extent = max(np.ptp(x), np.ptp(y))
+    return extent / map_width_px * pixel_fraction
+
+def simplify_route_indices(latitudes, longitudes, tolerance, fixed=None):
+    """Douglas-Peucker-Vereinfachung; liefert die Indizes der beibehaltenen Punkte.
+
+    Start, Ende und alle Indizes in fixed (z.B. Farbwechsel) bleiben immer erhalten.
+    Die Abstände je Teilstück werden vektorisiert mit numpy berechnet.
+    """
+    n = len(latitudes)
+    if n < 3 or tolerance <= 0:
+        return np.arange(n)
+    x, y = _project(latitudes, longitudes)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, n - 1]] = True
+    if fixed is not None:
+        keep[np.asarray(fixed, dtype=int)] = True
+    anchors = np.flatnonzero(keep)
+    stack = list(zip(anchors[:-1], anchors[1:]))
+
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        dx, dy = x[j] - x[i], y[j] - y[i]
+        px, py = x[i + 1:j] - x[i], y[i + 1:j] - y[i]
+        segment_length = np.hypot(dx, dy)
+        if segment_length == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(px * dy - py * dx) / segment_length
+        k = int(np.argmax(distances))
+        if distances[k] > tolerance:
+            split = i + 1 + k
+            keep[split] = True
+            stack.append((i, split))
+            stack.append((split, j))
+    return np.flatnonzero(keep)
+
 def get_available_metrics(df):
     """Effiziente Prüfung verfügbarer Metriken"""
     return {
@@ -142,7 +624,7 @@ def plot_gpx_folium_colored(df, color_metric='altitude'):
         return plot_gpx_folium_simple(lat, lon)
     
     # Gefilterte Metrik-Daten
-    metric_data = df[color_metric][mask].fillna(method='ffill').fillna(0)
+    metric_data = df[color_metric][mask].ffill().fillna(0)
     
     if len(lat) != len(metric_data):
         return plot_gpx_folium_simple(lat, lon)
@@ -174,25 +656,16 @@ def plot_gpx_folium_colored(df, color_metric='altitude'):
         norm = colors.Normalize(vmin=vmin, vmax=vmax)
         colormap = get_colormap()
         
-        # Effiziente Segment-Erstellung
-        coords = list(zip(latitudes, longitudes))
-        for i in range(len(coords) - 1):
-            avg_value = (metric_values[i] + metric_values[i + 1]) / 2
-            color = colors.rgb2hex(colormap(norm(avg_value)))
-            
-            folium.PolyLine(
-                locations=[coords[i], coords[i + 1]],
-                color=color,
-                weight=4,
-                opacity=0.8
-            ).add_to(m)
+        # Segmente nach quantisierter Farbe bündeln statt einer PolyLine pro Segment
+        add_colored_route(m, latitudes, longitudes, metric_values, norm, colormap)
         
         # Kompakte Legende
         add_legend(m, color_metric, vmin, vmax)
     else:
         # Einfache Route
+        kept = simplify_route_indices(latitudes, longitudes, route_tolerance(latitudes, longitudes))
         folium.PolyLine(
-            list(zip(latitudes, longitudes)),
+            list(zip(latitudes[kept], longitudes[kept])),
             color='blue',
             weight=4
         ).add_to(m)
@@ -206,6 +679,43 @@ def plot_gpx_folium_colored(df, color_metric='altitude'):
     
     return m
 
+def add_colored_route(m, latitudes, longitudes, metric_values, norm, colormap, n_colors=COLOR_BUCKETS,
+                      tolerance=None):
+    """Farbkodierte Route mit höchstens n_colors Layern.
+
+    Jedes Segment bekommt die Farbe seines Mittelwerts, quantisiert auf n_colors Stufen.
+    Aufeinanderfolgende Segmente gleicher Stufe werden zu einem Linienzug verbunden und
+    alle Linienzüge einer Stufe als eine Multi-PolyLine hinzugefügt. Jeder Linienzug wird
+    mit Douglas-Peucker vereinfacht (tolerance=None: passend zur Kartenansicht, 0: aus).
+    """
+    segment_values = (metric_values[:-1] + metric_values[1:]) / 2
+    buckets = np.clip((norm(segment_values) * n_colors).astype(int), 0, n_colors - 1)
+
+    # Läufe gleicher Farbstufe: Segmente start..end-1 entsprechen den Punkten start..end
+    changes = np.flatnonzero(np.diff(buckets)) + 1
+    starts = np.concatenate([[0], changes])
+    ends = np.concatenate([changes, [len(buckets)]])
+
+    # Farbwechsel bleiben bei der Vereinfachung als feste Punkte erhalten
+    if tolerance is None:
+        tolerance = route_tolerance(latitudes, longitudes)
+    kept = simplify_route_indices(latitudes, longitudes, tolerance, fixed=starts)
+
+    coords = np.column_stack([latitudes, longitudes])
+    runs_per_bucket = {}
+    for start, end in zip(starts, ends):
+        run = kept[np.searchsorted(kept, start):np.searchsorted(kept, end, side='right')]
+        runs_per_bucket.setdefault(buckets[start], []).append(coords[run].tolist())
+
+    for bucket, runs in runs_per_bucket.items():
+        color = colors.rgb2hex(colormap((bucket + 0.5) / n_colors))
+        folium.PolyLine(
+            locations=runs,
+            color=color,
+            weight=4,
+            opacity=0.8
+        ).add_to(m)
+
 def plot_gpx_folium_simple(lat, lon):
     """Einfache Folium-Karte ohne Farbkodierung mit Auto-Fit"""
     latitudes = lat.values
@@ -226,8 +736,9 @@ def plot_gpx_folium_simple(lat, lon):
         prefer_canvas=True
     )
     
+    kept = simplify_route_indices(latitudes, longitudes, route_tolerance(latitudes, longitudes))
     folium.PolyLine(
-        list(zip(latitudes, longitudes)),
+        list(zip(latitudes[kept], longitudes[kept])),
         color='blue',
         weight=4
     ).add_to(m)
@@ -277,7 +788,15 @@ def plot_gpx_folium(df):
     return plot_gpx_folium_simple(lat, lon)
 
 if __name__ == "__main__":
-    import os
+    import glob
+    import sys
+
+    # Benchmark: python read_fit_file.py benchmark [dateien...]
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        paths = sys.argv[2:] or sorted(glob.glob('data/fit_file/*.fit'))
+        print(benchmark_read_fit_file(paths).to_string(index=False))
+        sys.exit(0)
+
     fit_file_path = 'data/fit_file/pillersee.fit'
     
     if os.path.exists(fit_file_path):
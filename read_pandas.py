@@ -1,4 +1,5 @@
 # Paket für Bearbeitung von Tabellen
+import os
 import pandas as pd
 import numpy as np
 import plotly.express as px
@@ -6,10 +7,56 @@ import plotly.io as pio
 pio.renderers.default = "browser"
 
 
-def read_my_csv():
-    df = pd.read_csv("data/activities/activity.csv", sep=",", header=0)
-    time = np.arange(0, len(df))
-    df["Time"] = time
+ACTIVITY_CSV_PATH = "data/activities/activity.csv"
+
+
+ACTIVITY_COLUMNS = ["HeartRate", "PowerOriginal"]  # alles, was die Auswertung tatsächlich nutzt
+ACTIVITY_DTYPES = {"HeartRate": "float32", "PowerOriginal": "float32"}
+ACTIVITY_CACHE_DIR = ".cache"
+
+
+def _csv_engine():
+    """pyarrow-CSV-Parser verwenden, wenn installiert (deutlich schneller als der C-Parser)"""
+    try:
+        import pyarrow  # noqa: F401
+        return "pyarrow"
+    except ImportError:
+        return "c"
+
+
+def _activity_cache_path(path):
+    folder, filename = os.path.split(path)
+    return os.path.join(folder, ACTIVITY_CACHE_DIR, os.path.splitext(filename)[0] + ".parquet")
+
+
+def read_my_csv(path=ACTIVITY_CSV_PATH, columns=None, use_cache=False):
+    """Liest eine Aktivitäts-CSV mit nur den benötigten Spalten und kompakten Datentypen.
+
+    Herzfrequenz wird als uint16 gespeichert (float32, falls Lücken vorhanden sind),
+    Leistung als float32. Mit use_cache=True wird das Ergebnis als Parquet neben der
+    Datei abgelegt und bei unveränderter Quelle von dort geladen.
+    """
+    columns = columns or ACTIVITY_COLUMNS
+    cache_path = _activity_cache_path(path)
+    if use_cache and os.path.exists(cache_path) \
+            and os.stat(cache_path).st_mtime_ns >= os.stat(path).st_mtime_ns:
+        cached = pd.read_parquet(cache_path)
+        if set(columns).issubset(cached.columns):
+            return cached
+
+    df = pd.read_csv(path, sep=",", header=0, usecols=columns, engine=_csv_engine(),
+                     dtype={c: t for c, t in ACTIVITY_DTYPES.items() if c in columns})
+    df = df[columns]  # pyarrow hält sich nicht an die usecols-Reihenfolge
+    if "HeartRate" in df and df["HeartRate"].notna().all():
+        df["HeartRate"] = df["HeartRate"].astype("uint16")
+    df["Time"] = np.arange(0, len(df), dtype=np.int32)
+
+    if use_cache:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            df.to_parquet(cache_path, index=False)
+        except (ImportError, OSError):
+            pass  # ohne pyarrow/Schreibrechte eben ohne Cache
     return df
 
 def get_zone_limit(max_hr):
@@ -35,7 +82,66 @@ def assign_zone(hr, zones):
             return zone
     return 'Zone_5'  # Falls hr == max_hr
 
-def make_plot(df, zones):
+def zone_codes(hr, zones):
+    """Vektorisierte Zonen-Nummer (0-basiert) je Herzfrequenzwert, -1 außerhalb aller Zonen"""
+    hr = np.asarray(hr, dtype=float)
+    lows = np.array([low for low, _ in zones.values()])
+    highs = np.array([high for _, high in zones.values()])
+    codes = np.searchsorted(lows, hr, side='right') - 1
+    inside = (codes >= 0) & (hr < highs[np.clip(codes, 0, None)])
+    return np.where(inside, codes, -1)
+
+def classify_zones(hr, zones, codes=None):
+    """Wie assign_zone, aber für eine ganze Spalte auf einmal; liefert eine kategoriale Spalte.
+
+    codes: bereits mit zone_codes(hr, zones) berechnete Zonen-Nummern (spart die erneute Zuordnung).
+    """
+    names = list(zones)
+    if codes is None:
+        codes = zone_codes(hr, zones)
+    codes = np.where(codes == -1, names.index('Zone_5'), codes)  # gleiche Rückfallregel wie assign_zone
+    return pd.Categorical.from_codes(codes, categories=names)
+
+def _nan_bincount_mean(codes, values, n_zones):
+    valid = ~np.isnan(values)
+    sums = np.bincount(codes[valid], weights=values[valid], minlength=n_zones)
+    counts = np.bincount(codes[valid], minlength=n_zones)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+def zone_statistics(df, zones, strict=False, sample_seconds=1, codes=None):
+    """Kennzahlen je Herzfrequenzzone in einem Durchlauf (bincount statt Maske/groupby pro Zone).
+
+    Liefert je Zone Anzahl Samples, Dauer in Minuten, mittlere HF sowie mittlere und maximale
+    Leistung. strict=True zählt nur Werte innerhalb einer Zone (wie für die VO2max-Schätzung),
+    sonst gilt die Rückfallregel von assign_zone (alles andere -> Zone_5).
+    codes: bereits mit zone_codes(df['HeartRate'], zones) berechnete Zonen-Nummern.
+    """
+    names = list(zones)
+    if codes is None:
+        codes = zone_codes(df['HeartRate'], zones)
+    if strict:
+        selected = codes >= 0
+    else:
+        codes = np.where(codes == -1, names.index('Zone_5'), codes)
+        selected = np.ones(len(codes), dtype=bool)
+    codes = codes[selected]
+    hr = df['HeartRate'].to_numpy(dtype=float)[selected]
+    power = df['PowerOriginal'].to_numpy(dtype=float)[selected]
+
+    counts = np.bincount(codes, minlength=len(names))
+    max_power = np.full(len(names), np.nan)
+    np.fmax.at(max_power, codes, power)
+
+    return pd.DataFrame({
+        'samples': counts,
+        'duration_min': counts * sample_seconds / 60,
+        'avg_hr': _nan_bincount_mean(codes, hr, len(names)),
+        'avg_power': _nan_bincount_mean(codes, power, len(names)),
+        'max_power': max_power,
+    }, index=pd.Index(names, name='Zone'))
+
+def make_plot(df, zones, codes=None):
     zone_colors = {
         'Zone_1': 'blue',
         'Zone_2': 'green',
@@ -44,7 +150,8 @@ def make_plot(df, zones):
         'Zone_5': 'red'
     }
 
-    df['Zone'] = df['HeartRate'].apply(lambda x: assign_zone(x, zones))
+    # immer passend zu den übergebenen Zonen; codes aus zone_codes spart die erneute Zuordnung
+    df['Zone'] = classify_zones(df['HeartRate'], zones, codes)
 
     fig = px.scatter(
         df, x='Time', y='HeartRate', color='Zone',
@@ -73,21 +180,17 @@ def leistungsanalyse(df, weight_kg, age, resting_hr):
     results['calories'] = kcal
 
     # VO2max mit linearem HR-Leistung Zusammenhang schätzen
-    results['vo2max_est'] = vo2max_from_hr_power(df, weight_kg, results['max_hr'])
+    results['zone_stats'] = zone_statistics(df, get_zone_limit(results['max_hr']), strict=True)
+    results['vo2max_est'] = vo2max_from_hr_power(df, weight_kg, results['max_hr'], results['zone_stats'])
 
     return results
 
-def vo2max_from_hr_power(df, weight_kg, max_hr):
-    zones = get_zone_limit(max_hr)
+def vo2max_from_hr_power(df, weight_kg, max_hr, zone_stats=None):
+    if zone_stats is None:
+        zone_stats = zone_statistics(df, get_zone_limit(max_hr), strict=True)
 
-    zone_data = []
-    for zone, (low, high) in zones.items():
-        df_zone = df[(df['HeartRate'] >= low) & (df['HeartRate'] < high)]
-        if len(df_zone) == 0:
-            continue
-        avg_hr = df_zone['HeartRate'].mean()
-        avg_power = df_zone['PowerOriginal'].mean()
-        zone_data.append((avg_hr, avg_power))
+    occupied = zone_stats[zone_stats['samples'] > 0]
+    zone_data = list(zip(occupied['avg_hr'], occupied['avg_power']))
 
     if len(zone_data) < 2:
         print("Zu wenige Datenpunkte für VO2max-Schätzung.")
@@ -108,8 +211,6 @@ if __name__ == "__main__":
     max_hr = df['HeartRate'].max()
     zones = get_zone_limit(max_hr)
 
-    df['Zone'] = df['HeartRate'].apply(lambda x: assign_zone(x, zones))
-
     # Abfrage Gewicht, Alter und Ruhepuls für Kalorien & VO2max-Berechnung
     try:
         weight = float(input("Bitte Gewicht in kg eingeben: "))